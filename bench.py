@@ -0,0 +1,190 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+# 离线基准: 用 fake_compute 模拟后端跑 gcp.py 的主要流程，统计耗时、API 调用次数与延迟分布。
+# 用法: python bench.py [--flows create,reroll,firewall,list,teardown] [--instances 3] [--json out.json]
+
+FLOWS = ["create", "reroll", "firewall", "list", "teardown"]
+BENCH_PROJECT = "bench-project"
+BENCH_NETWORK = "global/networks/default"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="使用模拟 Compute API 离线测量 gcp.py 各流程耗时")
+    parser.add_argument("--flows", default=",".join(FLOWS), help="要运行的流程，逗号分隔，默认: %(default)s")
+    parser.add_argument("--instances", type=int, default=3, help="创建 / 刷 CPU / 删除的实例数")
+    parser.add_argument("--seed-instances", type=int, default=120, help="list 流程中额外预置的实例数")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="模拟延迟整体缩放倍数")
+    parser.add_argument("--amd-probability", type=float, default=0.4, help="每次启动分到 AMD 的概率")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="API 调用注入 503 的概率")
+    parser.add_argument("--op-error-rate", type=float, default=0.0, help="操作以失败结束的概率")
+    parser.add_argument("--page-size", type=int, default=50, help="列表接口每页条数")
+    parser.add_argument(
+        "--strategy", default="auto", choices=["auto", "stop_start", "recreate"], help="刷 CPU 的重置方式"
+    )
+    parser.add_argument("--poll-interval", type=float, default=None, help="操作等待出错后的重试初始间隔，默认沿用 gcp.py")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    parser.add_argument("--json", help="把结果写入 JSON 文件，便于前后对比")
+    parser.add_argument("--verbose", action="store_true", help="显示各流程自身的输出")
+    return parser.parse_args(argv)
+
+
+def scaled_overrides(args):
+    from fake_compute import FAKE_DEFAULTS
+
+    scale = args.latency_scale
+    return {
+        "call_latency": FAKE_DEFAULTS["call_latency"] * scale,
+        "op_latency": {kind: value * scale for kind, value in FAKE_DEFAULTS["op_latency"].items()},
+        "platform_delay": FAKE_DEFAULTS["platform_delay"] * scale,
+        "amd_probability": {"default": args.amd_probability},
+        "error_rate": args.error_rate,
+        "op_error_rate": args.op_error_rate,
+        "page_size": args.page_size,
+        "projects": [BENCH_PROJECT],
+        "seed": args.seed,
+    }
+
+
+def bench_targets(gcp, count):
+    zones = ["us-west1-a", "us-west1-b", "us-central1-a", "us-east1-b"]
+    return [
+        {
+            "project": BENCH_PROJECT,
+            "zone": zones[i % len(zones)],
+            "name": f"bench-vm-{i + 1}",
+            "os_config": gcp.OS_IMAGE_OPTIONS[0],
+        }
+        for i in range(count)
+    ]
+
+
+def run_flow(gcp, backend, name, args, state):
+    targets = state["targets"]
+    infos = [{"name": target["name"], "zone": target["zone"]} for target in targets]
+
+    if name == "create":
+        results = gcp.batch_create_instances(targets)
+        return {"ok": sum(1 for item in results if not item["error"]), "total": len(results)}
+    if name == "reroll":
+        results = gcp.reroll_cpu_parallel(
+            BENCH_PROJECT, infos, max_workers=len(infos), stop_on_first=False, strategy=args.strategy
+        )
+        return {
+            "ok": sum(1 for result in results if result["success"]),
+            "total": len(results),
+            "attempts": sum(result["attempts"] for result in results),
+        }
+    if name == "firewall":
+        ranges = gcp.load_cdn_deny_ranges()
+        first = gcp.add_deny_cdn_egress(BENCH_PROJECT, ranges, BENCH_NETWORK)
+        again = gcp.add_deny_cdn_egress(BENCH_PROJECT, ranges, BENCH_NETWORK)
+        return {"ok": int(first) + int(again), "total": 2}
+    if name == "list":
+        if not state.get("seeded"):
+            for i in range(args.seed_instances):
+                backend.seed_instance(BENCH_PROJECT, "us-central1-f", f"seed-vm-{i + 1}")
+            state["seeded"] = True
+        instances = gcp.list_instances(BENCH_PROJECT, quiet=True)
+        return {"ok": len(instances), "total": len(instances)}
+    if name == "teardown":
+        deleted = gcp.teardown_free_resources([(BENCH_PROJECT, info) for info in infos])
+        return {"ok": len(deleted), "total": len(infos)}
+    raise ValueError(f"未知流程: {name}")
+
+
+def summarize_latencies(gcp, samples):
+    return {
+        method: {"count": len(values), "p50": gcp.percentile(values, 50), "p95": gcp.percentile(values, 95)}
+        for method, values in sorted(samples.items())
+    }
+
+
+def print_report(results):
+    print("\n=== 离线基准结果 ===")
+    print(f"{'流程':<10} {'墙钟耗时':>9} {'API 调用':>9} {'操作数':>7} {'操作 p50':>9} {'操作 p95':>9}  结果")
+    for result in results:
+        ops = result["operations"]
+        p50 = f"{ops['p50']:.2f}s" if ops["p50"] is not None else "-"
+        p95 = f"{ops['p95']:.2f}s" if ops["p95"] is not None else "-"
+        outcome = f"{result['outcome']['ok']}/{result['outcome']['total']}"
+        if "attempts" in result["outcome"]:
+            outcome += f" (共 {result['outcome']['attempts']} 次尝试)"
+        if result.get("error"):
+            outcome += f" 异常: {result['error']}"
+        print(
+            f"{result['flow']:<10} {result['wall']:>8.2f}s {sum(result['calls'].values()):>9} "
+            f"{ops['submitted']:>7} {p50:>9} {p95:>9}  {outcome}"
+        )
+
+    print("\n--- 各方法调用次数与延迟 ---")
+    for result in results:
+        print(f"[{result['flow']}]")
+        for method, stats in result["latencies"].items():
+            print(
+                f"  {method:<26} {stats['count']:>5} 次 | p50 {stats['p50'] * 1000:>7.1f}ms | "
+                f"p95 {stats['p95'] * 1000:>7.1f}ms"
+            )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    flows = [flow.strip() for flow in args.flows.split(",") if flow.strip()]
+    unknown = [flow for flow in flows if flow not in FLOWS]
+    if unknown:
+        print(f"未知流程: {', '.join(unknown)} (可选: {', '.join(FLOWS)})")
+        sys.exit(2)
+
+    # 缓存目录必须在导入 gcp 之前指定，避免读写真实的实例缓存。
+    os.environ["GCP_FREE_CACHE_DIR"] = tempfile.mkdtemp(prefix="gcp_free_bench_")
+    import fake_compute
+    import gcp
+
+    backend = fake_compute.install(gcp, **scaled_overrides(args))
+    state = {"targets": bench_targets(gcp, args.instances)}
+    results = []
+
+    for flow in flows:
+        tracker_options = {"initial_interval": args.poll_interval} if args.poll_interval else {}
+        gcp.OPERATIONS = gcp.OperationTracker(**tracker_options)
+        backend.reset_counters()
+        sink = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        error = None
+        started = time.monotonic()
+        with sink:
+            try:
+                outcome = run_flow(gcp, backend, flow, args, state)
+            except Exception as e:
+                outcome = {"ok": 0, "total": 0}
+                error = str(e)
+        wall = time.monotonic() - started
+        stats = backend.stats()
+        results.append(
+            {
+                "flow": flow,
+                "wall": wall,
+                "outcome": outcome,
+                "error": error,
+                "calls": stats["calls"],
+                "latencies": summarize_latencies(gcp, stats["call_latencies"]),
+                "operations": gcp.OPERATIONS.metrics(),
+            }
+        )
+        print(f"{flow}: {wall:.2f}s")
+
+    print_report(results)
+    gcp.finish_tracing()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,650 @@
+import copy
+import enum
+import itertools
+import random
+import re
+import threading
+import time
+import types
+
+# 离线模拟 Compute / Resource Manager API，供 bench.py 在无网络、不消耗配额的情况下
+# 跑 gcp.py 的各个流程。只实现 gcp.py 用到的类型与方法，行为尽量贴近真实 API:
+# 变更操作立即返回 Operation，状态在操作完成后才生效；列表接口分页返回。
+
+FAKE_DEFAULTS = {
+    # 单次 API 调用的往返耗时 (秒)
+    "call_latency": 0.02,
+    # 各类操作从提交到完成的耗时 (秒)
+    "op_latency": {"insert": 0.6, "delete": 0.5, "start": 0.5, "stop": 0.4, "firewall": 0.3, "disk": 0.3},
+    # 耗时随机抖动比例
+    "jitter": 0.2,
+    # 每次启动分到 AMD 的概率，可按可用区覆盖
+    "amd_probability": {"default": 0.3},
+    # 启动完成后 cpu_platform 变为可见所需时间 (秒)
+    "platform_delay": 0.5,
+    "page_size": 50,
+    # 调用直接报 503 的概率
+    "error_rate": 0.0,
+    # 操作以失败结束的概率 (如 start 遇到资源不足)
+    "op_error_rate": 0.0,
+    # operations.wait 长轮询的最长阻塞时间 (秒)，真实服务约 2 分钟
+    "wait_timeout": 120.0,
+    "zones": ["us-west1-a", "us-west1-b", "us-west1-c", "us-central1-a", "us-central1-f", "us-east1-b"],
+    "projects": ["fake-project"],
+    "seed": None,
+}
+REGION_URL_BASE = "https://www.googleapis.com/compute/v1/regions"
+AMD_PLATFORM = "AMD Rome"
+OTHER_PLATFORMS = ["Intel Broadwell", "Intel Skylake", "Intel Cascade Lake"]
+
+
+class NotFound(Exception):
+    def __init__(self, what):
+        super().__init__(f"404 Not Found: {what} was not found")
+
+
+class Conflict(Exception):
+    def __init__(self, what):
+        super().__init__(f"409 Conflict: {what} already exists")
+
+
+class BadRequest(Exception):
+    pass
+
+
+class ServiceUnavailable(Exception):
+    def __init__(self, method):
+        super().__init__(f"503 Service Unavailable: injected failure in {method}")
+
+
+class Message:
+    # 类似 proto-plus: 未赋值的字段带默认值，列表字段默认为空列表。
+    _fields = {}
+
+    def __init__(self, **kwargs):
+        for key, default in self._fields.items():
+            setattr(self, key, copy.copy(default))
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def __setattr__(self, key, value):
+        # 与真实类型一样拒绝未知字段，字段名写错能在离线测试中暴露。
+        if key not in self._fields:
+            raise AttributeError(f"{type(self).__name__} has no field {key!r}")
+        object.__setattr__(self, key, value)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.__dict__})"
+
+
+def message(type_name, /, **fields):
+    return type(type_name, (Message,), {"_fields": fields})
+
+
+class OperationStatus(enum.Enum):
+    PENDING = 1
+    RUNNING = 2
+    DONE = 3
+
+
+class AccessConfigType(enum.Enum):
+    ONE_TO_ONE_NAT = 1
+
+
+class NetworkTier(enum.Enum):
+    PREMIUM = 1
+    STANDARD = 2
+
+
+class ProjectState(enum.Enum):
+    ACTIVE = 1
+    DELETE_REQUESTED = 2
+
+
+Firewall = message(
+    "Firewall", name="", direction="", network="", priority=1000,
+    source_ranges=[], destination_ranges=[], allowed=[], denied=[],
+)
+Allowed = message("Allowed", I_p_protocol="")
+Denied = message("Denied", I_p_protocol="")
+AttachedDiskInitializeParams = message("AttachedDiskInitializeParams", source_image="", disk_size_gb=0, disk_type="")
+AttachedDisk = message(
+    "AttachedDisk", boot=False, auto_delete=False, source="", device_name="", initialize_params=None,
+)
+AccessConfig = message("AccessConfig", name="", type_="", network_tier="", nat_i_p="")
+AccessConfig.Type = AccessConfigType
+AccessConfig.NetworkTier = NetworkTier
+NetworkInterface = message("NetworkInterface", name="", network="", network_i_p="", access_configs=[])
+Tags = message("Tags", items=[])
+Address = message("Address", name="", address="", region="", status="RESERVED")
+Instance = message(
+    "Instance", name="", machine_type="", status="", cpu_platform="", disks=[], network_interfaces=[], tags=None,
+)
+InstancesScopedList = message("InstancesScopedList", instances=[])
+Zone = message("Zone", name="", status="UP", region="")
+Image = message("Image", name="", self_link="")
+OperationErrorItem = message("OperationErrorItem", code="", message="")
+OperationErrorInfo = message("OperationErrorInfo", errors=[])
+Operation = message("Operation", name="", status=OperationStatus.PENDING, error=None, zone="", operation_type="")
+Operation.Status = OperationStatus
+ListZonesRequest = message("ListZonesRequest", project="", filter="")
+AggregatedListInstancesRequest = message("AggregatedListInstancesRequest", project="")
+ListAddressesRequest = message("ListAddressesRequest", project="", region="", filter="")
+Project = message("Project", project_id="", display_name="", state=ProjectState.ACTIVE)
+Project.State = ProjectState
+SearchProjectsRequest = message("SearchProjectsRequest", query="")
+
+COMPUTE_TYPES = [
+    Firewall, Allowed, Denied, AttachedDisk, AttachedDiskInitializeParams, AccessConfig, NetworkInterface, Tags,
+    Address, Instance, InstancesScopedList, Zone, Image, Operation, ListZonesRequest, AggregatedListInstancesRequest,
+    ListAddressesRequest,
+]
+
+
+class FakeBackend:
+    def __init__(self, **overrides):
+        self.config = copy.deepcopy(FAKE_DEFAULTS)
+        for key, value in overrides.items():
+            if isinstance(value, dict) and isinstance(self.config.get(key), dict):
+                self.config[key].update(value)
+            else:
+                self.config[key] = value
+        self.random = random.Random(self.config["seed"])
+        self.lock = threading.RLock()
+        self.instances = {}
+        self.disks = {}
+        self.firewalls = {}
+        self.addresses = {}
+        self.operations = {}
+        self.calls = {}
+        self.call_latencies = {}
+        self.op_durations = {}
+        self._op_ids = itertools.count(1)
+        self._ip_ids = itertools.count(2)
+        self.compute_v1 = self._build_compute_module()
+        self.resourcemanager_v3 = self._build_resourcemanager_module()
+
+    # ---- 公共辅助 ----
+
+    def _jittered(self, seconds):
+        jitter = self.config["jitter"]
+        with self.lock:
+            return max(0.0, seconds * self.random.uniform(1 - jitter, 1 + jitter))
+
+    def _call(self, method, latency=None):
+        # 每次调用都计数、模拟往返耗时，并按 error_rate 注入 503。
+        started = time.monotonic()
+        time.sleep(self._jittered(self.config["call_latency"] if latency is None else latency))
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self.call_latencies.setdefault(method, []).append(time.monotonic() - started)
+            failed = self.random.random() < self.config["error_rate"]
+        if failed:
+            raise ServiceUnavailable(method)
+
+    def _start_operation(self, project, kind, apply, zone="", fail_message=None, rollback=None):
+        with self.lock:
+            name = f"operation-{next(self._op_ids)}"
+            error = None
+            if fail_message is None and self.random.random() < self.config["op_error_rate"]:
+                fail_message = f"injected failure in {kind}"
+            if fail_message is not None:
+                error = OperationErrorInfo(errors=[OperationErrorItem(code="INJECTED", message=fail_message)])
+            duration = self._jittered(self.config["op_latency"][kind])
+            self.operations[(project, name)] = {
+                "kind": kind,
+                "zone": zone,
+                "started": time.monotonic(),
+                "done_at": time.monotonic() + duration,
+                "apply": apply if error is None else rollback,
+                "error": error,
+                "done": False,
+            }
+            self.op_durations.setdefault(kind, []).append(duration)
+        return Operation(name=name, status=OperationStatus.RUNNING, zone=zone, operation_type=kind)
+
+    def _advance(self):
+        # 按完成时间顺序应用已到期操作的状态变更。
+        now = time.monotonic()
+        with self.lock:
+            due = sorted(
+                (op for op in self.operations.values() if not op["done"] and op["done_at"] <= now),
+                key=lambda op: op["done_at"],
+            )
+            for op in due:
+                op["done"] = True
+                if op["apply"] is not None:
+                    op["apply"]()
+
+    def _get_operation(self, project, name):
+        self._advance()
+        with self.lock:
+            op = self.operations.get((project, name))
+            if op is None:
+                raise NotFound(f"operation {name}")
+            status = OperationStatus.DONE if op["done"] else OperationStatus.RUNNING
+            return Operation(
+                name=name,
+                status=status,
+                error=op["error"] if op["done"] else None,
+                zone=op["zone"],
+                operation_type=op["kind"],
+            )
+
+    def _wait_operation(self, project, name):
+        # 阻塞到操作完成或 wait_timeout 到期，与真实 operations.wait 一致。
+        with self.lock:
+            op = self.operations.get((project, name))
+            if op is None:
+                raise NotFound(f"operation {name}")
+            remaining = op["done_at"] - time.monotonic()
+        if remaining > 0:
+            time.sleep(min(remaining, self.config["wait_timeout"]))
+        return self._get_operation(project, name)
+
+    def _pages(self, method, items):
+        # 模拟分页: 每取一页算一次调用。
+        size = max(1, self.config["page_size"])
+        for start in range(0, max(len(items), 1), size):
+            self._call(method)
+            yield from items[start:start + size]
+
+    def _pick_platform(self, zone):
+        probabilities = self.config["amd_probability"]
+        chance = probabilities.get(zone, probabilities.get("default", 0.3))
+        with self.lock:
+            if self.random.random() < chance:
+                return AMD_PLATFORM
+            return self.random.choice(OTHER_PLATFORMS)
+
+    # ---- 场景准备 ----
+
+    def seed_instance(self, project, zone, name, status="RUNNING", platform=None):
+        with self.lock:
+            self._create_instance(project, zone, Instance(name=name, disks=[AttachedDisk(boot=True, auto_delete=True)]))
+            inst = self.instances[(project, zone, name)]
+            inst["status"] = status
+            if status == "RUNNING":
+                inst["platform"] = platform or self._pick_platform(zone)
+                inst["platform_at"] = 0.0
+        return inst
+
+    def seed_firewall(self, project, rule):
+        with self.lock:
+            self.firewalls[(project, rule.name)] = copy.deepcopy(rule)
+
+    def seed_address(self, project, region, name, address):
+        with self.lock:
+            self.addresses[(project, region, name)] = Address(
+                name=name, address=address, region=f"{REGION_URL_BASE}/{region}", status="IN_USE"
+            )
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls.clear()
+            self.call_latencies.clear()
+            self.op_durations.clear()
+
+    # ---- 实例 ----
+
+    def _create_instance(self, project, zone, resource):
+        disks = []
+        for index, disk in enumerate(resource.disks or [AttachedDisk(boot=True, auto_delete=True)]):
+            if disk.source:
+                disk_name = disk.source.split("/")[-1]
+            else:
+                disk_name = resource.name if index == 0 else f"{resource.name}-{index}"
+            self.disks[(project, zone, disk_name)] = {"users": {resource.name}}
+            disks.append(
+                {"name": disk_name, "boot": disk.boot, "auto_delete": disk.auto_delete, "attached": bool(disk.source)}
+            )
+        ip_id = next(self._ip_ids)
+        self.instances[(project, zone, resource.name)] = {
+            "name": resource.name,
+            "status": "PROVISIONING",
+            "platform": None,
+            "platform_at": None,
+            "disks": disks,
+            "internal_ip": f"10.128.{ip_id // 256}.{ip_id % 256}",
+            "external_ip": f"34.82.{ip_id // 256}.{ip_id % 256}",
+        }
+
+    def _power_on(self, project, zone, name):
+        inst = self.instances.get((project, zone, name))
+        if inst is None:
+            return
+        inst["status"] = "RUNNING"
+        inst["platform"] = self._pick_platform(zone)
+        inst["platform_at"] = time.monotonic() + self._jittered(self.config["platform_delay"])
+
+    def _instance_message(self, project, zone, inst):
+        visible = (
+            inst["status"] == "RUNNING" and inst["platform_at"] is not None and time.monotonic() >= inst["platform_at"]
+        )
+        base = f"https://www.googleapis.com/compute/v1/projects/{project}"
+        return Instance(
+            name=inst["name"],
+            status=inst["status"],
+            cpu_platform=inst["platform"] if visible else "Unknown CPU Platform",
+            machine_type=f"{base}/zones/{zone}/machineTypes/e2-micro",
+            disks=[
+                AttachedDisk(
+                    boot=disk["boot"],
+                    auto_delete=disk["auto_delete"],
+                    device_name=disk["name"],
+                    source=f"{base}/zones/{zone}/disks/{disk['name']}",
+                )
+                for disk in inst["disks"]
+            ],
+            network_interfaces=[
+                NetworkInterface(
+                    name="nic0",
+                    network=f"{base}/global/networks/default",
+                    network_i_p=inst["internal_ip"],
+                    access_configs=[AccessConfig(name="External NAT", nat_i_p=inst["external_ip"])]
+                    if inst["status"] == "RUNNING"
+                    else [AccessConfig(name="External NAT")],
+                )
+            ],
+        )
+
+    def _require_instance(self, project, zone, name):
+        inst = self.instances.get((project, zone, name))
+        if inst is None:
+            raise NotFound(f"projects/{project}/zones/{zone}/instances/{name}")
+        return inst
+
+    def _build_compute_module(self):
+        backend = self
+
+        class InstancesClient:
+            def __init__(self, credentials=None):
+                pass
+
+            def get(self, project, zone, instance):
+                backend._call("instances.get")
+                backend._advance()
+                with backend.lock:
+                    return backend._instance_message(project, zone, backend._require_instance(project, zone, instance))
+
+            def aggregated_list(self, request):
+                backend._advance()
+                with backend.lock:
+                    items = [
+                        (zone, backend._instance_message(project, zone, inst))
+                        for (project, zone, _), inst in sorted(backend.instances.items())
+                        if project == request.project
+                    ]
+                by_zone = {}
+                for zone, inst in backend._pages("instances.aggregatedList", items):
+                    by_zone.setdefault(zone, []).append(inst)
+                for zone in backend.config["zones"]:
+                    yield f"zones/{zone}", InstancesScopedList(instances=by_zone.pop(zone, []))
+                for zone, instances in by_zone.items():
+                    yield f"zones/{zone}", InstancesScopedList(instances=instances)
+
+            def insert(self, project, zone, instance_resource):
+                backend._call("instances.insert")
+                with backend.lock:
+                    if (project, zone, instance_resource.name) in backend.instances:
+                        raise Conflict(f"projects/{project}/zones/{zone}/instances/{instance_resource.name}")
+                    for disk in instance_resource.disks:
+                        if disk.source:
+                            disk_key = (project, zone, disk.source.split("/")[-1])
+                            if disk_key not in backend.disks:
+                                raise NotFound(disk.source)
+                            if backend.disks[disk_key]["users"]:
+                                raise BadRequest(f"400 Bad Request: disk {disk.source} is already being used")
+                    backend._create_instance(project, zone, instance_resource)
+
+                def rollback():
+                    inst = backend.instances.pop((project, zone, instance_resource.name), None)
+                    for disk in inst["disks"] if inst else []:
+                        # 挂载的已有磁盘只解除占用，随实例新建的磁盘一并撤销。
+                        if disk["attached"]:
+                            backend.disks[(project, zone, disk["name"])]["users"].discard(instance_resource.name)
+                        else:
+                            backend.disks.pop((project, zone, disk["name"]), None)
+
+                return backend._start_operation(
+                    project,
+                    "insert",
+                    lambda: backend._power_on(project, zone, instance_resource.name),
+                    zone=zone,
+                    rollback=rollback,
+                )
+
+            def start(self, project, zone, instance):
+                backend._call("instances.start")
+                with backend.lock:
+                    backend._require_instance(project, zone, instance)
+                return backend._start_operation(
+                    project, "start", lambda: backend._power_on(project, zone, instance), zone=zone
+                )
+
+            def stop(self, project, zone, instance):
+                backend._call("instances.stop")
+                with backend.lock:
+                    inst = backend._require_instance(project, zone, instance)
+                    inst["status"] = "STOPPING"
+
+                def apply():
+                    inst.update(status="TERMINATED", platform=None, platform_at=None)
+
+                return backend._start_operation(project, "stop", apply, zone=zone)
+
+            def delete(self, project, zone, instance):
+                backend._call("instances.delete")
+                with backend.lock:
+                    inst = backend._require_instance(project, zone, instance)
+                    inst["status"] = "STOPPING"
+
+                def apply():
+                    backend.instances.pop((project, zone, instance), None)
+                    for disk in inst["disks"]:
+                        disk_key = (project, zone, disk["name"])
+                        if disk_key in backend.disks:
+                            backend.disks[disk_key]["users"].discard(instance)
+                            if disk["auto_delete"]:
+                                del backend.disks[disk_key]
+
+                return backend._start_operation(project, "delete", apply, zone=zone)
+
+            def set_disk_auto_delete(self, project, zone, instance, auto_delete, device_name):
+                backend._call("instances.setDiskAutoDelete")
+                with backend.lock:
+                    inst = backend._require_instance(project, zone, instance)
+                    disk = next((disk for disk in inst["disks"] if disk["name"] == device_name), None)
+                    if disk is None:
+                        raise NotFound(f"device {device_name}")
+
+                def apply():
+                    disk["auto_delete"] = auto_delete
+
+                return backend._start_operation(project, "disk", apply, zone=zone)
+
+        class DisksClient:
+            def __init__(self, credentials=None):
+                pass
+
+            def delete(self, project, zone, disk):
+                backend._call("disks.delete")
+                with backend.lock:
+                    entry = backend.disks.get((project, zone, disk))
+                    if entry is None:
+                        raise NotFound(f"projects/{project}/zones/{zone}/disks/{disk}")
+                    if entry["users"]:
+                        users = ", ".join(sorted(entry["users"]))
+                        raise BadRequest(f"400 Bad Request: disk {disk} is already being used by {users}")
+                return backend._start_operation(
+                    project, "disk", lambda: backend.disks.pop((project, zone, disk), None), zone=zone
+                )
+
+        class FirewallsClient:
+            def __init__(self, credentials=None):
+                pass
+
+            def list(self, project):
+                backend._advance()
+                with backend.lock:
+                    rules = [
+                        copy.deepcopy(rule)
+                        for (rule_project, _), rule in sorted(backend.firewalls.items())
+                        if rule_project == project
+                    ]
+                for rule in rules:
+                    if not rule.network.startswith("https://"):
+                        rule.network = f"https://www.googleapis.com/compute/v1/projects/{project}/{rule.network}"
+                return backend._pages("firewalls.list", rules)
+
+            def insert(self, project, firewall_resource):
+                backend._call("firewalls.insert")
+                with backend.lock:
+                    if (project, firewall_resource.name) in backend.firewalls:
+                        raise Conflict(f"projects/{project}/global/firewalls/{firewall_resource.name}")
+                rule = copy.deepcopy(firewall_resource)
+                return backend._start_operation(
+                    project, "firewall", lambda: backend.firewalls.__setitem__((project, rule.name), rule)
+                )
+
+            def patch(self, project, firewall, firewall_resource):
+                backend._call("firewalls.patch")
+                with backend.lock:
+                    if (project, firewall) not in backend.firewalls:
+                        raise NotFound(f"projects/{project}/global/firewalls/{firewall}")
+                rule = copy.deepcopy(firewall_resource)
+                return backend._start_operation(
+                    project, "firewall", lambda: backend.firewalls.__setitem__((project, firewall), rule)
+                )
+
+            def delete(self, project, firewall):
+                backend._call("firewalls.delete")
+                with backend.lock:
+                    if (project, firewall) not in backend.firewalls:
+                        raise NotFound(f"projects/{project}/global/firewalls/{firewall}")
+                return backend._start_operation(
+                    project, "firewall", lambda: backend.firewalls.pop((project, firewall), None)
+                )
+
+        class ZonesClient:
+            def __init__(self, credentials=None):
+                pass
+
+            def list(self, request=None, metadata=None, project=None):
+                pattern = None
+                if request is not None:
+                    match = re.fullmatch(r'name eq "(.*)"', request.filter or "")
+                    pattern = re.compile(match.group(1)) if match else None
+                zones = [
+                    Zone(name=zone, status="UP", region=f"{REGION_URL_BASE}/{zone.rsplit('-', 1)[0]}")
+                    for zone in backend.config["zones"]
+                    if pattern is None or pattern.fullmatch(zone)
+                ]
+                return backend._pages("zones.list", zones)
+
+        class ImagesClient:
+            def __init__(self, credentials=None):
+                pass
+
+            def get_from_family(self, project, family):
+                backend._call("images.getFromFamily")
+                return Image(
+                    name=f"{family}-v20260101",
+                    self_link=f"https://www.googleapis.com/compute/v1/projects/{project}/global/images/{family}-v20260101",
+                )
+
+        class ZoneOperationsClient:
+            def __init__(self, credentials=None):
+                pass
+
+            def get(self, project, zone, operation):
+                backend._call("zoneOperations.get")
+                return backend._get_operation(project, operation)
+
+            def wait(self, project, zone, operation):
+                backend._call("zoneOperations.wait")
+                return backend._wait_operation(project, operation)
+
+        class AddressesClient:
+            def __init__(self, credentials=None):
+                pass
+
+            def list(self, request=None, project=None, region=None):
+                # 与真实客户端一致: filter 只能通过 request 传入。
+                if request is not None:
+                    if project is not None or region is not None:
+                        raise ValueError("request 与 project/region 不能同时传入")
+                    project, region = request.project, request.region
+                match = re.fullmatch(r'address\s*=\s*"(.*)"', request.filter if request is not None else "")
+                with backend.lock:
+                    addresses = [
+                        address
+                        for (address_project, address_region, _), address in sorted(backend.addresses.items())
+                        if address_project == project
+                        and address_region == region
+                        and (match is None or address.address == match.group(1))
+                    ]
+                return backend._pages("addresses.list", addresses)
+
+        class GlobalOperationsClient:
+            def __init__(self, credentials=None):
+                pass
+
+            def get(self, project, operation):
+                backend._call("globalOperations.get")
+                return backend._get_operation(project, operation)
+
+            def wait(self, project, operation):
+                backend._call("globalOperations.wait")
+                return backend._wait_operation(project, operation)
+
+        module = types.ModuleType("fake_compute.compute_v1")
+        for message_type in COMPUTE_TYPES:
+            setattr(module, message_type.__name__, message_type)
+        for client_cls in (
+            InstancesClient, DisksClient, FirewallsClient, ZonesClient, ImagesClient, AddressesClient,
+            ZoneOperationsClient, GlobalOperationsClient,
+        ):
+            setattr(module, client_cls.__name__, client_cls)
+        return module
+
+    def _build_resourcemanager_module(self):
+        backend = self
+
+        class ProjectsClient:
+            def __init__(self, credentials=None):
+                pass
+
+            def search_projects(self, request):
+                projects = [
+                    Project(project_id=project_id, display_name=project_id, state=ProjectState.ACTIVE)
+                    for project_id in backend.config["projects"]
+                ]
+                return backend._pages("projects.search", projects)
+
+        module = types.ModuleType("fake_compute.resourcemanager_v3")
+        module.ProjectsClient = ProjectsClient
+        module.Project = Project
+        module.SearchProjectsRequest = SearchProjectsRequest
+        return module
+
+    # ---- 统计 ----
+
+    def stats(self):
+        with self.lock:
+            return {
+                "calls": dict(self.calls),
+                "call_latencies": {method: list(values) for method, values in self.call_latencies.items()},
+                "op_durations": {kind: list(values) for kind, values in self.op_durations.items()},
+            }
+
+
+def install(gcp_module, backend=None, **overrides):
+    # 把 gcp.py 的 LazyModule 与客户端注册表指向模拟后端，之后所有 get_client 都拿到假客户端。
+    backend = backend or FakeBackend(**overrides)
+    gcp_module.compute_v1._module = backend.compute_v1
+    gcp_module.resourcemanager_v3._module = backend.resourcemanager_v3
+    with gcp_module._CLIENTS_LOCK:
+        gcp_module._CLIENTS.clear()
+        gcp_module._CREDENTIALS["value"] = None
+    return backend
@@ -1,33 +1,108 @@
+import base64
 import getpass
+import hashlib
+import importlib
+import ipaddress
+import json
 import os
+import random
 import shutil
+import sqlite3
+import stat
 import subprocess
 import sys
+import threading
 import time
 import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+
+_STARTUP_AT = time.perf_counter()
+_IMPORT_TIMINGS = []
+_MISSING_LIBS_HINT = [
+    "【错误】缺少必要的 Python 库。",
+    "请先在终端运行以下命令安装：",
+    "pip install google-cloud-compute google-cloud-resource-manager",
+]
+
+
+class LazyModule:
+    # google-cloud 库导入耗时数秒，推迟到第一次访问属性时才真正导入。
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self, quiet=False):
+        if self._module is not None:
+            return self._module
+        with self._lock:
+            if self._module is None:
+                started = time.perf_counter()
+                try:
+                    module = importlib.import_module(self._name)
+                except ImportError:
+                    if quiet:
+                        return None
+                    for line in _MISSING_LIBS_HINT:
+                        print(line)
+                    raise SystemExit(1)
+                _IMPORT_TIMINGS.append((self._name, time.perf_counter() - started, threading.current_thread().name))
+                self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+
+compute_v1 = LazyModule("google.cloud.compute_v1")
+resourcemanager_v3 = LazyModule("google.cloud.resourcemanager_v3")
+
+
+def prefetch_google_modules(modules):
+    # 在用户浏览菜单时后台预先导入，首次调用 API 时无需再等待。
+    def worker():
+        for module in modules:
+            module.load(quiet=True)
+
+    thread = threading.Thread(target=worker, name="prefetch-imports", daemon=True)
+    thread.start()
+    return thread
+
+
+def print_startup_report(menu_ready_at=None):
+    print("\n--- 启动耗时报告 ---")
+    if menu_ready_at is not None:
+        print(f"脚本加载到开始交互: {menu_ready_at - _STARTUP_AT:.3f}s")
+    if not _IMPORT_TIMINGS:
+        print("本次会话未导入 google-cloud 库。")
+    for name, seconds, thread_name in _IMPORT_TIMINGS:
+        where = "后台预取" if thread_name == "prefetch-imports" else "按需导入"
+        print(f"{name:<36} {seconds:.3f}s ({where})")
 
-try:
-    from google.cloud import compute_v1
-    from google.cloud import resourcemanager_v3
-except ImportError:
-    print("【错误】缺少必要的 Python 库。")
-    print("请先在终端运行以下命令安装：")
-    print("pip install google-cloud-compute google-cloud-resource-manager")
-    sys.exit(1)
 
 GITHUB_REPO = "fatekey/gcp_free"
 GITHUB_BRANCH = "master"
 GITHUB_RAW_BASE = f"https://raw.githubusercontent.com/{GITHUB_REPO}/{GITHUB_BRANCH}"
 GITHUB_RAW_SCRIPTS_BASE = f"{GITHUB_RAW_BASE}/scripts"
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCAL_SCRIPTS_DIR = os.path.join(SCRIPT_DIR, "scripts")
+REMOTE_CACHE_DIR = "$HOME/.cache/gcp_free"
+REMOTE_CACHE_MISS_EXIT = 215
+SSH_CONTROL_DIR = f"/tmp/gcpf-{os.getuid()}" if hasattr(os, "getuid") else ""
+SSH_CONTROL_FALLBACK_DIR = os.path.join(os.path.expanduser("~"), ".ssh", "gcpf")
+SSH_CONTROL_PERSIST = "10m"
+DAE_CONFIG_PATH = "/usr/local/etc/dae/config.dae"
 REMOTE_SCRIPT_URLS = {
     "apt": f"{GITHUB_RAW_SCRIPTS_BASE}/apt.sh",
     "dae": f"{GITHUB_RAW_SCRIPTS_BASE}/dae.sh",
     "net_iptables": f"{GITHUB_RAW_SCRIPTS_BASE}/net_iptables.sh",
     "net_shutdown": f"{GITHUB_RAW_SCRIPTS_BASE}/net_shutdown.sh",
 }
+CDN_DENY_RULE_PREFIX = "deny-cdn-egress-custom"
+FIREWALL_MAX_RANGES_PER_RULE = 256
 FIREWALL_RULES_TO_CLEAN = [
     "allow-all-ingress-custom",
-    "deny-cdn-egress-custom",
+    CDN_DENY_RULE_PREFIX,
 ]
 
 REGION_OPTIONS = [
@@ -36,25 +111,335 @@ REGION_OPTIONS = [
     {"name": "南卡罗来纳 (South Carolina)", "region": "us-east1", "default_zone": "us-east1-b"},
 ]
 
+CACHE_DIR = os.environ.get("GCP_FREE_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "gcp_free")
+INVENTORY_TTL = 300
+INVENTORY_MAX_STALE = 7 * 24 * 3600
+ZONE_CACHE_TTL = 24 * 3600
+IMAGE_CACHE_TTL = 12 * 3600
+ZONE_LIST_FIELD_MASK = [("x-goog-fieldmask", "items.name,items.status,items.region,nextPageToken")]
+
 OS_IMAGE_OPTIONS = [
     {"name": "Debian 12 (Bookworm)", "project": "debian-cloud", "family": "debian-12"},
     {"name": "Ubuntu 22.04 LTS", "project": "ubuntu-os-cloud", "family": "ubuntu-2204-lts"},
 ]
 
 
+_PRINT_LOCK = threading.Lock()
+
+
+def print_line(line):
+    with _PRINT_LOCK:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
 def print_info(msg):
-    print(f"[信息] {msg}")
-    sys.stdout.flush()
+    print_line(f"[信息] {msg}")
 
 
 def print_success(msg):
-    print(f"\033[92m[成功] {msg}\033[0m")
-    sys.stdout.flush()
+    print_line(f"\033[92m[成功] {msg}\033[0m")
 
 
 def print_warning(msg):
-    print(f"\033[93m[警告] {msg}\033[0m")
-    sys.stdout.flush()
+    print_line(f"\033[93m[警告] {msg}\033[0m")
+
+
+# GCP_FREE_TRACE=1 开启调用追踪，退出时打印汇总；值为文件路径时同时导出 Chrome trace
+# (chrome://tracing / Perfetto 可直接打开)。GCP_FREE_TRACE_FORMAT=spans 改为导出原始 span 列表。
+TRACE_TARGET = os.environ.get("GCP_FREE_TRACE", "")
+TRACE_ENABLED = TRACE_TARGET not in ("", "0")
+TRACE_MAX_SPANS = 200000
+_TRACE_SPANS = []
+_TRACE_LOCK = threading.Lock()
+
+
+def record_span(category, name, start, end, args=None, error=None, thread=None):
+    span = {
+        "cat": category,
+        "name": name,
+        "start": start,
+        "end": end,
+        "thread": thread or threading.current_thread().name,
+        "args": args or {},
+    }
+    if error is not None:
+        span["error"] = str(error)
+    with _TRACE_LOCK:
+        if len(_TRACE_SPANS) < TRACE_MAX_SPANS:
+            _TRACE_SPANS.append(span)
+
+
+class TraceSpan:
+    __slots__ = ("category", "name", "args", "start")
+
+    def __init__(self, category, name, args):
+        self.category = category
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_span(self.category, self.name, self.start, time.monotonic(), self.args, exc)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def trace_span(category, name, **args):
+    # 关闭时返回共享的空对象，调用方只多一次函数调用。
+    if not TRACE_ENABLED:
+        return _NOOP_SPAN
+    return TraceSpan(category, name, args)
+
+
+class TracedPager:
+    # 分页结果在迭代时才逐页请求，单独记一个覆盖整个迭代过程的 span。
+    def __init__(self, pager, name):
+        self._pager = pager
+        self._name = name
+
+    def __iter__(self):
+        start = time.monotonic()
+        count = 0
+        error = None
+        try:
+            for item in self._pager:
+                count += 1
+                yield item
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            record_span("api", f"{self._name} (分页)", start, time.monotonic(), {"items": count}, error)
+
+    def __getattr__(self, attr):
+        return getattr(self._pager, attr)
+
+
+class TracedClient:
+    # 只在开启追踪时由 get_client 包一层，为每个 API 方法调用记录 span。
+    def __init__(self, client, client_name):
+        self._client = client
+        self._client_name = client_name
+
+    def __getattr__(self, attr):
+        value = getattr(self._client, attr)
+        if attr.startswith("_") or not callable(value):
+            return value
+        name = f"{self._client_name}.{attr}"
+
+        def traced(*args, **kwargs):
+            start = time.monotonic()
+            try:
+                result = value(*args, **kwargs)
+            except Exception as e:
+                record_span("api", name, start, time.monotonic(), error=e)
+                raise
+            record_span("api", name, start, time.monotonic())
+            if hasattr(result, "__iter__") and not isinstance(result, (str, bytes, list, tuple, dict)):
+                return TracedPager(result, name)
+            return result
+
+        return traced
+
+
+def summarize_spans(spans):
+    groups = {}
+    for span in spans:
+        groups.setdefault((span["cat"], span["name"]), []).append(span)
+    rows = []
+    for (category, name), items in groups.items():
+        durations = [item["end"] - item["start"] for item in items]
+        rows.append(
+            {
+                "cat": category,
+                "name": name,
+                "count": len(items),
+                "errors": sum(1 for item in items if "error" in item),
+                "total": sum(durations),
+                "p50": percentile(durations, 50),
+                "p95": percentile(durations, 95),
+                "max": max(durations),
+            }
+        )
+    rows.sort(key=lambda row: -row["total"])
+    return rows
+
+
+def print_trace_summary():
+    with _TRACE_LOCK:
+        spans = list(_TRACE_SPANS)
+    if not spans:
+        return
+    print("\n--- 调用追踪汇总（按总耗时排序） ---")
+    print(f"{'类别':<10} {'名称':<44} {'次数':>6} {'失败':>5} {'总计':>9} {'p50':>8} {'p95':>8} {'最大':>8}")
+    for row in summarize_spans(spans):
+        print(
+            f"{row['cat']:<12} {row['name'][:44]:<44} {row['count']:>6} {row['errors']:>5} "
+            f"{row['total']:>8.2f}s {row['p50']:>7.2f}s {row['p95']:>7.2f}s {row['max']:>7.2f}s"
+        )
+
+
+def build_chrome_trace(spans):
+    if not spans:
+        return {"traceEvents": []}
+    origin = min(span["start"] for span in spans)
+    thread_ids = {}
+    events = []
+    for span in spans:
+        tid = thread_ids.setdefault(span["thread"], len(thread_ids) + 1)
+        args = dict(span["args"])
+        if "error" in span:
+            args["error"] = span["error"]
+        events.append(
+            {
+                "name": span["name"],
+                "cat": span["cat"],
+                "ph": "X",
+                "ts": round((span["start"] - origin) * 1e6),
+                "dur": round((span["end"] - span["start"]) * 1e6),
+                "pid": os.getpid(),
+                "tid": tid,
+                "args": args,
+            }
+        )
+    for thread_name, tid in thread_ids.items():
+        events.append(
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": thread_name}}
+        )
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def export_trace(path, fmt="chrome"):
+    with _TRACE_LOCK:
+        spans = list(_TRACE_SPANS)
+    data = spans if fmt == "spans" else build_chrome_trace(spans)
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+        print_info(f"调用追踪已导出: {path} ({len(spans)} 个 span)")
+    except OSError as e:
+        print_warning(f"导出调用追踪失败: {e}")
+
+
+def finish_tracing():
+    if not TRACE_ENABLED:
+        return
+    print_trace_summary()
+    if TRACE_TARGET != "1":
+        export_trace(TRACE_TARGET, os.environ.get("GCP_FREE_TRACE_FORMAT", "chrome"))
+
+
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+_CLIENT_STATS = {}
+_CREDENTIALS = {}
+
+
+def get_credentials():
+    # 凭据只解析一次，所有客户端共用，避免每个客户端重复走 ADC 查找流程。
+    with _CLIENTS_LOCK:
+        if "value" not in _CREDENTIALS:
+            try:
+                import google.auth
+
+                credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+            except Exception as e:
+                print_warning(f"预先解析默认凭据失败，将由各客户端自行解析: {e}")
+                credentials = None
+            _CREDENTIALS["value"] = credentials
+        return _CREDENTIALS["value"]
+
+
+def get_client(client_name, module=None):
+    # 进程内共享客户端（及其底层传输与凭据），多线程并发调用也只建立一次。
+    module = module or compute_v1
+    key = (module.__name__, client_name)
+    credentials = get_credentials()
+    with _CLIENTS_LOCK:
+        stats = _CLIENT_STATS.setdefault(client_name, {"created": 0, "reused": 0})
+        client = _CLIENTS.get(key)
+        if client is None:
+            client_cls = getattr(module, client_name)
+            client = client_cls(credentials=credentials) if credentials else client_cls()
+            if TRACE_ENABLED:
+                client = TracedClient(client, client_name)
+            _CLIENTS[key] = client
+            stats["created"] += 1
+        else:
+            stats["reused"] += 1
+        return client
+
+
+def print_client_stats():
+    with _CLIENTS_LOCK:
+        snapshot = {name: dict(stats) for name, stats in _CLIENT_STATS.items()}
+    if not snapshot:
+        return
+    total_created = sum(stats["created"] for stats in snapshot.values())
+    total_reused = sum(stats["reused"] for stats in snapshot.values())
+    print("\n--- API 客户端复用统计 ---")
+    for name in sorted(snapshot):
+        stats = snapshot[name]
+        print(f"{name:<24} 新建 {stats['created']:>3} | 复用 {stats['reused']:>5}")
+    print(f"{'合计':<22} 新建 {total_created:>3} | 复用 {total_reused:>5}")
+
+
+def cache_path(filename):
+    return os.path.join(CACHE_DIR, filename)
+
+
+def read_json_cache(filename):
+    try:
+        with open(cache_path(filename), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json_cache(filename, data):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{cache_path(filename)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path(filename))
+    except OSError as e:
+        print_warning(f"写入本地缓存失败: {e}")
+
+
+_LOOKUP_CACHE_LOCK = threading.Lock()
+
+
+def cached_lookup(filename, key, ttl, loader):
+    # 小型 JSON 键值缓存：命中且未过期直接返回，否则调用 loader 并写回。
+    with _LOOKUP_CACHE_LOCK:
+        data = read_json_cache(filename) or {}
+    entry = data.get(key)
+    if entry and time.time() - entry.get("fetched_at", 0) < ttl:
+        return entry["value"]
+
+    value = loader()
+    with _LOOKUP_CACHE_LOCK:
+        data = read_json_cache(filename) or {}
+        data[key] = {"fetched_at": time.time(), "value": value}
+        write_json_cache(filename, data)
+    return value
 
 
 def select_from_list(items, prompt_text, label_fn):
@@ -78,17 +463,22 @@ def prompt_manual_project_id():
         print("输入不能为空，请重试。")
 
 
+def list_active_projects():
+    client = get_client("ProjectsClient", resourcemanager_v3)
+    request = resourcemanager_v3.SearchProjectsRequest(query="")
+    page_result = client.search_projects(request=request)
+
+    active_projects = []
+    for project in page_result:
+        if project.state == resourcemanager_v3.Project.State.ACTIVE:
+            active_projects.append(project)
+    return active_projects
+
+
 def select_gcp_project():
     print_info("正在扫描您的项目列表...")
     try:
-        client = resourcemanager_v3.ProjectsClient()
-        request = resourcemanager_v3.SearchProjectsRequest(query="")
-        page_result = client.search_projects(request=request)
-
-        active_projects = []
-        for project in page_result:
-            if project.state == resourcemanager_v3.Project.State.ACTIVE:
-                active_projects.append(project)
+        active_projects = list_active_projects()
 
         if not active_projects:
             print_warning("未找到活跃的项目。请手动输入项目 ID。")
@@ -112,10 +502,18 @@ def select_gcp_project():
         return prompt_manual_project_id()
 
 
-def list_zones_for_region(project_id, region):
-    zones_client = compute_v1.ZonesClient()
+def fetch_zones_for_region(project_id, region):
+    zones_client = get_client("ZonesClient")
+    request = compute_v1.ListZonesRequest(project=project_id, filter=f'name eq "{region}-.*"')
+    try:
+        # 只请求需要的字段，并由服务端按区域过滤。
+        zone_list = list(zones_client.list(request=request, metadata=ZONE_LIST_FIELD_MASK))
+    except Exception as e:
+        print_warning(f"按区域过滤可用区失败，改为全量获取: {e}")
+        zone_list = list(zones_client.list(project=project_id))
+
     zones = []
-    for zone in zones_client.list(project=project_id):
+    for zone in zone_list:
         if zone.status != "UP":
             continue
         zone_region = zone.region.split("/")[-1] if zone.region else ""
@@ -124,8 +522,49 @@ def list_zones_for_region(project_id, region):
     return sorted(zones)
 
 
+def list_zones_for_region(project_id, region):
+    return cached_lookup(
+        "zones.json",
+        f"{project_id}/{region}",
+        ZONE_CACHE_TTL,
+        lambda: fetch_zones_for_region(project_id, region),
+    )
+
+
+def resolve_image_self_link(os_config):
+    def loader():
+        images_client = get_client("ImagesClient")
+        image = images_client.get_from_family(project=os_config["project"], family=os_config["family"])
+        return image.self_link
+
+    try:
+        return cached_lookup(
+            "images.json",
+            f"{os_config['project']}/{os_config['family']}",
+            IMAGE_CACHE_TTL,
+            loader,
+        )
+    except Exception as e:
+        # 镜像族 URL 也可直接用于创建，由服务端解析为最新镜像。
+        print_warning(f"解析镜像失败，改用镜像族地址: {e}")
+        return f"projects/{os_config['project']}/global/images/family/{os_config['family']}"
+
+
 def select_zone(project_id):
-    region_config = select_from_list(REGION_OPTIONS, "请选择部署区域", lambda r: r["name"])
+    stats = zone_reroll_stats()
+
+    def region_label(region_config):
+        known = [
+            entry
+            for zone, entry in stats.items()
+            if zone.startswith(f"{region_config['region']}-") and entry["expected"] is not None
+        ]
+        if not known:
+            return region_config["name"]
+        best = min(known, key=lambda entry: entry["expected"])
+        return f"{region_config['name']} | 最快 {best['zone']}: {format_zone_stats(best)}"
+
+    region_config = select_from_list(REGION_OPTIONS, "请选择部署区域", region_label)
     region = region_config["region"]
     default_zone = region_config["default_zone"]
 
@@ -140,93 +579,210 @@ def select_zone(project_id):
         print_warning(f"未获取到可用区列表，使用默认可用区 {default_zone}。")
         return default_zone
 
-    return select_from_list(zones, f"请选择可用区 ({region})", lambda z: z)
+    # 按历史刷 CPU 统计把预计最快刷到 AMD 的可用区排在前面；只有排第一的区域有实测数据时才标记推荐。
+    zones, zone_stats = rank_zones(zones)
+    best = zones[0] if zone_stats.get(zones[0], {}).get("expected") is not None else None
+
+    def zone_label(zone):
+        label = f"{zone} ({format_zone_stats(zone_stats.get(zone))})"
+        return f"{label} [推荐]" if zone == best else label
+
+    return select_from_list(zones, f"请选择可用区 ({region})", zone_label)
 
 
 def select_os_image():
     return select_from_list(OS_IMAGE_OPTIONS, "请选择操作系统", lambda o: o["name"])
 
 
-def create_instance(project_id, zone, os_config, instance_name="free-tier-vm"):
-    instance_client = compute_v1.InstancesClient()
-    images_client = compute_v1.ImagesClient()
+def build_instance_resource(zone, os_config, instance_name):
+    source_disk_image = resolve_image_self_link(os_config)
+
+    disk = compute_v1.AttachedDisk()
+    disk.boot = True
+    disk.auto_delete = True
+    initialize_params = compute_v1.AttachedDiskInitializeParams()
+    initialize_params.source_image = source_disk_image
+    initialize_params.disk_size_gb = 30
+    initialize_params.disk_type = f"zones/{zone}/diskTypes/pd-standard"
+    disk.initialize_params = initialize_params
+
+    network_interface = compute_v1.NetworkInterface()
+    network_interface.name = "global/networks/default"
+
+    access_config = compute_v1.AccessConfig()
+    access_config.name = "External NAT"
+    access_config.type_ = compute_v1.AccessConfig.Type.ONE_TO_ONE_NAT.name
+    access_config.network_tier = compute_v1.AccessConfig.NetworkTier.STANDARD.name
+    network_interface.access_configs = [access_config]
+
+    instance = compute_v1.Instance()
+    instance.name = instance_name
+    instance.machine_type = f"zones/{zone}/machineTypes/e2-micro"
+    instance.disks = [disk]
+    instance.network_interfaces = [network_interface]
+
+    tags = compute_v1.Tags()
+    tags.items = ["http-server", "https-server"]
+    instance.tags = tags
+    return instance
+
+
+def submit_instance_insert(project_id, zone, os_config, instance_name):
+    instance_client = get_client("InstancesClient")
+    instance = build_instance_resource(zone, os_config, instance_name)
+    return instance_client.insert(
+        project=project_id,
+        zone=zone,
+        instance_resource=instance,
+    )
 
+
+def create_instance(project_id, zone, os_config, instance_name="free-tier-vm"):
     print(f"\n[开始] 正在 {project_id} 项目中准备资源...")
     print(f"可用区: {zone}")
     print(f"系统: {os_config['name']}")
 
     try:
-        image_response = images_client.get_from_family(
-            project=os_config["project"],
-            family=os_config["family"],
-        )
-        source_disk_image = image_response.self_link
-
-        disk = compute_v1.AttachedDisk()
-        disk.boot = True
-        disk.auto_delete = True
-        initialize_params = compute_v1.AttachedDiskInitializeParams()
-        initialize_params.source_image = source_disk_image
-        initialize_params.disk_size_gb = 30
-        initialize_params.disk_type = f"zones/{zone}/diskTypes/pd-standard"
-        disk.initialize_params = initialize_params
-
-        network_interface = compute_v1.NetworkInterface()
-        network_interface.name = "global/networks/default"
-
-        access_config = compute_v1.AccessConfig()
-        access_config.name = "External NAT"
-        access_config.type_ = compute_v1.AccessConfig.Type.ONE_TO_ONE_NAT.name
-        access_config.network_tier = compute_v1.AccessConfig.NetworkTier.STANDARD.name
-        network_interface.access_configs = [access_config]
-
-        instance = compute_v1.Instance()
-        instance.name = instance_name
-        instance.machine_type = f"zones/{zone}/machineTypes/e2-micro"
-        instance.disks = [disk]
-        instance.network_interfaces = [network_interface]
-
-        tags = compute_v1.Tags()
-        tags.items = ["http-server", "https-server"]
-        instance.tags = tags
-
-        print("配置组装完成，正在向 Google Cloud 发送创建请求...")
-        operation = instance_client.insert(
-            project=project_id,
-            zone=zone,
-            instance_resource=instance,
-        )
+        print("正在组装配置并向 Google Cloud 发送创建请求...")
+        operation = submit_instance_insert(project_id, zone, os_config, instance_name)
 
         print("请求已发送，正在等待操作完成... (约 30-60 秒)")
-        operation_client = compute_v1.ZoneOperationsClient()
-        operation = operation_client.wait(
-            project=project_id,
-            zone=zone,
-            operation=operation.name,
-        )
+        wait_for_operation(project_id, zone, operation.name)
 
-        if operation.error:
-            print("创建失败:", operation.error)
+        print_success(f"实例 '{instance_name}' 已创建！")
+        inst_info = refresh_instance(project_id, zone, instance_name)
+        if inst_info:
+            print(f"外部 IP 地址: {inst_info['external_ip']}")
         else:
-            print_success(f"实例 '{instance_name}' 已创建！")
-            try:
-                inst_info = instance_client.get(project=project_id, zone=zone, instance=instance_name)
-                ip = inst_info.network_interfaces[0].access_configs[0].nat_i_p
-                print(f"外部 IP 地址: {ip}")
-            except Exception:
-                pass
-            print("请前往 GCP 控制台查看详情。")
-
+            # 创建已经成功，只是刷新详情失败，不能当作创建失败。
+            print_warning("获取实例详情失败，稍后可在列表中查看外部 IP。")
+            inst_info = {"name": instance_name, "zone": zone}
+        print("请前往 GCP 控制台查看详情。")
+        return inst_info
+
+    except OperationError as e:
+        print("创建失败:", e)
     except Exception as e:
         print(f"\n[失败] 操作中止: {e}")
         traceback.print_exc()
+    return None
+
 
+def batch_create_instances(targets, max_submit_workers=8):
+    # 先并发提交全部创建请求，再统一跟踪，N 台的总耗时接近单台。
+    started = time.monotonic()
+    print_info(f"正在提交 {len(targets)} 个创建请求...")
 
-def list_instances(project_id):
-    instance_client = compute_v1.InstancesClient()
+    def submit(target):
+        item = dict(target, submitted_at=time.monotonic(), error=None)
+        try:
+            operation = submit_instance_insert(target["project"], target["zone"], target["os_config"], target["name"])
+        except Exception as e:
+            item.update(error=describe_api_error(e), finished_at=time.monotonic())
+            return item, None
+
+        return item, OPERATIONS.track_zone(target["project"], target["zone"], operation.name)
+
+    with ThreadPoolExecutor(max_workers=min(max_submit_workers, len(targets))) as executor:
+        submitted = list(executor.map(submit, targets))
+    pending = [item for item, _ in submitted]
+    futures = {future: item for item, future in submitted if future is not None}
+
+    print_info(f"已提交 {len(futures)}/{len(pending)} 个请求，正在统一等待操作完成 (进行中 {OPERATIONS.in_flight()})...")
+    for future in as_completed(futures):
+        item = futures[future]
+        item["finished_at"] = time.monotonic()
+        if future.exception() is not None:
+            item["error"] = str(future.exception())
+
+    succeeded = [item for item in pending if not item["error"]]
+    if succeeded:
+        with ThreadPoolExecutor(max_workers=min(max_submit_workers, len(succeeded))) as executor:
+            infos = executor.map(lambda item: refresh_instance(item["project"], item["zone"], item["name"]), succeeded)
+            for item, info in zip(succeeded, infos):
+                item["instance_info"] = info
+
+    print("\n--- 批量创建结果 ---")
+    print(f"{'项目':<28} {'可用区':<15} {'实例':<20} {'结果':<6} {'耗时':>8}  外网IP / 错误")
+    for item in pending:
+        latency = f"{item['finished_at'] - item['submitted_at']:.1f}s"
+        if item["error"]:
+            status, detail = "失败", item["error"]
+        else:
+            status = "成功"
+            detail = (item.get("instance_info") or {}).get("external_ip", "-")
+        print(f"{item['project']:<28} {item['zone']:<15} {item['name']:<20} {status:<6} {latency:>8}  {detail}")
+    ok = sum(1 for item in pending if not item["error"])
+    print_info(f"完成 {ok}/{len(pending)}，总耗时 {time.monotonic() - started:.1f}s。")
+    return pending
+
+
+def parse_batch_target(line, default_project):
+    parts = line.split()
+    if len(parts) != 4:
+        return None, "格式应为: 项目ID 可用区 系统编号 实例名"
+    project, zone, os_choice, name = parts
+    if not os_choice.isdigit() or not 1 <= int(os_choice) <= len(OS_IMAGE_OPTIONS):
+        return None, f"系统编号应为 1-{len(OS_IMAGE_OPTIONS)}"
+    return {
+        "project": default_project if project == "-" else project,
+        "zone": zone,
+        "os_config": OS_IMAGE_OPTIONS[int(os_choice) - 1],
+        "name": name,
+    }, None
+
+
+def batch_create_menu(default_project):
+    print("\n--- 批量新建实例 ---")
+    print("每行一个目标: 项目ID 可用区 系统编号 实例名（项目ID 填 - 表示当前项目），空行结束。")
+    for i, os_config in enumerate(OS_IMAGE_OPTIONS):
+        print(f"  系统编号 {i+1}: {os_config['name']}")
+    print(f"  示例: - {REGION_OPTIONS[0]['default_zone']} 1 free-vm-1")
+
+    targets = []
+    while True:
+        line = input(f"目标 {len(targets) + 1}: ").strip()
+        if not line:
+            break
+        target, error = parse_batch_target(line, default_project)
+        if error:
+            print(f"输入无效: {error}")
+            continue
+        targets.append(target)
+
+    if not targets:
+        print("未输入任何目标，已取消。")
+        return []
+    return batch_create_instances(targets)
+
+
+def instance_to_dict(instance, zone_short):
+    network = None
+    internal_ip = "-"
+    external_ip = "-"
+    if instance.network_interfaces:
+        network = instance.network_interfaces[0].network
+        internal_ip = instance.network_interfaces[0].network_i_p
+        access_configs = instance.network_interfaces[0].access_configs
+        if access_configs:
+            external_ip = access_configs[0].nat_i_p or "-"
+    return {
+        "name": instance.name,
+        "zone": zone_short,
+        "status": instance.status,
+        "cpu_platform": instance.cpu_platform or "Unknown CPU Platform",
+        "network": network or "global/networks/default",
+        "internal_ip": internal_ip,
+        "external_ip": external_ip,
+    }
+
+
+def list_instances(project_id, quiet=False):
+    instance_client = get_client("InstancesClient")
     request = compute_v1.AggregatedListInstancesRequest(project=project_id)
 
-    print_info(f"正在扫描项目 {project_id} 中的实例...")
+    if not quiet:
+        print_info(f"正在扫描项目 {project_id} 中的实例...")
 
     instances = []
     for zone_path, response in instance_client.aggregated_list(request=request):
@@ -234,36 +790,113 @@ def list_instances(project_id):
             continue
         zone_short = zone_path.split("/")[-1]
         for instance in response.instances:
-            network = None
-            internal_ip = "-"
-            external_ip = "-"
-            if instance.network_interfaces:
-                network = instance.network_interfaces[0].network
-                internal_ip = instance.network_interfaces[0].network_i_p
-                access_configs = instance.network_interfaces[0].access_configs
-                if access_configs:
-                    external_ip = access_configs[0].nat_i_p or "-"
-            instances.append(
-                {
-                    "name": instance.name,
-                    "zone": zone_short,
-                    "status": instance.status,
-                    "cpu_platform": instance.cpu_platform or "Unknown CPU Platform",
-                    "network": network or "global/networks/default",
-                    "internal_ip": internal_ip,
-                    "external_ip": external_ip,
-                }
-            )
+            instances.append(instance_to_dict(instance, zone_short))
+    save_inventory(project_id, instances)
     return instances
 
 
-def select_instance(project_id):
-    instances = list_instances(project_id)
-    if not instances:
-        print_warning("该项目中没有任何实例！")
+_INVENTORY_LOCK = threading.Lock()
+_INVENTORY_REFRESHING = {}
+
+
+def inventory_filename(project_id):
+    return f"inventory-{project_id}.json"
+
+
+def load_inventory(project_id):
+    data = read_json_cache(inventory_filename(project_id))
+    if not data or data.get("project") != project_id:
+        return None
+    return data
+
+
+def save_inventory(project_id, instances):
+    with _INVENTORY_LOCK:
+        write_json_cache(
+            inventory_filename(project_id),
+            {"project": project_id, "fetched_at": time.time(), "instances": instances},
+        )
+
+
+def revalidate_inventory(project_id):
+    with _INVENTORY_LOCK:
+        thread = _INVENTORY_REFRESHING.get(project_id)
+        if thread is not None and thread.is_alive():
+            return thread
+
+        def worker():
+            try:
+                list_instances(project_id, quiet=True)
+            except Exception:
+                pass
+
+        thread = threading.Thread(target=worker, name=f"inventory-{project_id}", daemon=True)
+        _INVENTORY_REFRESHING[project_id] = thread
+        thread.start()
+        return thread
+
+
+def warm_inventory(project_id):
+    data = load_inventory(project_id)
+    if data is None or time.time() - data.get("fetched_at", 0) >= INVENTORY_TTL:
+        revalidate_inventory(project_id)
+
+
+def get_inventory(project_id, force_refresh=False):
+    # 缓存新鲜时直接使用；过期但未超过上限时先用旧数据并在后台重新拉取。
+    data = None if force_refresh else load_inventory(project_id)
+    if data is None and not force_refresh:
+        thread = _INVENTORY_REFRESHING.get(project_id)
+        if thread is not None and thread.is_alive():
+            print_info(f"正在等待后台扫描项目 {project_id} 中的实例...")
+            thread.join()
+            data = load_inventory(project_id)
+    if data is not None:
+        age = time.time() - data.get("fetched_at", 0)
+        if age < INVENTORY_MAX_STALE:
+            if age >= INVENTORY_TTL:
+                revalidate_inventory(project_id)
+            print_info(f"使用本地实例缓存 ({format_duration(age)} 前更新，输入 r 可强制刷新)。")
+            return data["instances"]
+    return list_instances(project_id)
+
+
+def update_cached_instance(project_id, zone, instance_name, instance_info):
+    with _INVENTORY_LOCK:
+        data = load_inventory(project_id)
+        if data is None:
+            return
+        instances = [
+            inst
+            for inst in data["instances"]
+            if not (inst["name"] == instance_name and inst["zone"] == zone)
+        ]
+        if instance_info is not None:
+            instances.append(instance_info)
+            instances.sort(key=lambda inst: (inst["zone"], inst["name"]))
+        data["instances"] = instances
+        write_json_cache(inventory_filename(project_id), data)
+
+
+def refresh_instance(project_id, zone, instance_name):
+    # 自己发起的操作结束后只刷新这一台，不重新做全量扫描。
+    instance_client = get_client("InstancesClient")
+    try:
+        inst = instance_client.get(project=project_id, zone=zone, instance=instance_name)
+    except Exception as e:
+        if is_not_found_error(e):
+            update_cached_instance(project_id, zone, instance_name, None)
         return None
+    instance_info = instance_to_dict(inst, zone)
+    update_cached_instance(project_id, zone, instance_name, instance_info)
+    return instance_info
+
+
+def forget_instance(project_id, zone, instance_name):
+    update_cached_instance(project_id, zone, instance_name, None)
 
-    print("\n--- 请选择目标服务器 ---")
+
+def print_instance_table(instances):
     for i, inst in enumerate(instances):
         status_color = "\033[92m" if inst["status"] == "RUNNING" else "\033[91m"
         network_short = inst["network"].split("/")[-1] if inst["network"] else "-"
@@ -273,76 +906,1094 @@ def select_instance(project_id):
             f"{inst['internal_ip']} | 外网IP: {inst['external_ip']} | CPU: {inst['cpu_platform']}"
         )
 
+
+def select_instance(project_id):
+    force_refresh = False
     while True:
-        choice = input(f"请输入数字选择 (1-{len(instances)}): ").strip()
-        if choice.isdigit():
-            idx = int(choice) - 1
-            if 0 <= idx < len(instances):
-                return instances[idx]
+        instances = get_inventory(project_id, force_refresh=force_refresh)
+        if not instances:
+            print_warning("该项目中没有任何实例！")
+            return None
+
+        print("\n--- 请选择目标服务器 ---")
+        print_instance_table(instances)
+
+        while True:
+            choice = input(f"请输入数字选择 (1-{len(instances)}，r 刷新列表): ").strip().lower()
+            if choice == "r":
+                force_refresh = True
+                break
+            if choice.isdigit():
+                idx = int(choice) - 1
+                if 0 <= idx < len(instances):
+                    return instances[idx]
+            print("输入无效，请重试。")
+
+
+def describe_api_error(exc):
+    msg = str(exc)
+    lowered = msg.lower()
+    # 未启用结算同样返回 403，必须先于权限判断。
+    if "billing" in lowered:
+        return "未绑定结算账号"
+    if "service_disabled" in lowered or "has not been used" in lowered or "is disabled" in lowered:
+        return "Compute Engine API 未启用"
+    if "permission" in lowered or "403" in lowered or "forbidden" in lowered:
+        return "无权限访问"
+    return msg.splitlines()[0][:120] if msg else type(exc).__name__
+
+
+def scan_all_projects(project_ids, max_workers=8):
+    # 各项目并发扫描，结果到达即输出；单个项目报错不影响其他项目。
+    found = []
+    failures = []
+    print_info(f"正在并发扫描 {len(project_ids)} 个项目中的实例（并发上限 {max_workers}）...")
+    print_line(f"\n{'#':>4} {'项目':<30} {'实例':<20} {'区域':<15} {'状态':<11} {'外网IP':<16} CPU")
+
+    def scan(project_id):
+        return list_instances(project_id, quiet=True)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(scan, project_id): project_id for project_id in project_ids}
+        for future in as_completed(futures):
+            project_id = futures[future]
+            try:
+                instances = future.result()
+            except Exception as e:
+                failures.append((project_id, describe_api_error(e)))
+                print_line(f"{'-':>4} {project_id:<30} \033[93m跳过: {describe_api_error(e)}\033[0m")
+                continue
+            if not instances:
+                print_line(f"{'-':>4} {project_id:<30} (无实例)")
+            for inst in instances:
+                inst = dict(inst, project=project_id)
+                found.append(inst)
+                print_line(
+                    f"{len(found):>4} {project_id:<30} {inst['name']:<20} {inst['zone']:<15} "
+                    f"{inst['status']:<11} {inst['external_ip']:<16} {inst['cpu_platform']}"
+                )
+
+    print_info(
+        f"扫描完成: {len(project_ids)} 个项目，{len(found)} 台实例，"
+        f"{len(failures)} 个项目跳过，耗时 {time.monotonic() - started:.1f}s。"
+    )
+    return found
+
+
+def select_instance_across_projects():
+    try:
+        projects = list_active_projects()
+    except Exception as e:
+        print_warning(f"无法列出项目: {e}")
+        return None
+    if not projects:
+        print_warning("未找到活跃的项目。")
+        return None
+
+    found = scan_all_projects([p.project_id for p in projects])
+    if not found:
+        print_warning("所有项目中都没有实例。")
+        return None
+
+    while True:
+        choice = input(f"请输入编号选择服务器 (1-{len(found)}，0 返回): ").strip()
+        if choice == "0":
+            return None
+        if choice.isdigit() and 1 <= int(choice) <= len(found):
+            return found[int(choice) - 1]
         print("输入无效，请重试。")
 
 
+def parse_multi_choice(choice, count):
+    choice = choice.strip().lower()
+    if choice in ("a", "all"):
+        return list(range(count))
+    indexes = []
+    for part in choice.replace("，", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, _, end = part.partition("-")
+            if not (start.strip().isdigit() and end.strip().isdigit()):
+                return None
+            span = range(int(start) - 1, int(end))
+        elif part.isdigit():
+            span = [int(part) - 1]
+        else:
+            return None
+        for idx in span:
+            if not 0 <= idx < count:
+                return None
+            if idx not in indexes:
+                indexes.append(idx)
+    return indexes or None
+
+
+def select_instances(project_id):
+    force_refresh = False
+    while True:
+        instances = get_inventory(project_id, force_refresh=force_refresh)
+        if not instances:
+            print_warning("该项目中没有任何实例！")
+            return []
+
+        print("\n--- 请选择目标服务器（可多选） ---")
+        print_instance_table(instances)
+
+        while True:
+            choice = input(
+                f"请输入编号，多个用逗号分隔，支持 1-3 范围，a 表示全部，r 刷新列表 (1-{len(instances)}): "
+            ).strip().lower()
+            if choice == "r":
+                force_refresh = True
+                break
+            indexes = parse_multi_choice(choice, len(instances))
+            if indexes:
+                return [instances[idx] for idx in indexes]
+            print("输入无效，请重试。")
+
+
+class OperationError(Exception):
+    pass
+
+
+def operation_error_message(operation):
+    errors = getattr(operation.error, "errors", None) or []
+    if errors:
+        return "; ".join(err.message for err in errors)
+    return str(operation.error)
+
+
+class OperationTracker:
+    # 统一跟踪 zone / global 操作：每个操作由一个后台线程调用 operations.wait 长轮询，
+    # 服务端在操作完成 (或约 2 分钟) 时立即返回，没有客户端轮询间隔带来的延迟。
+    # 调用方拿到 Future，可同时发起多个变更后再一起等待。
+    def __init__(self, max_workers=32, initial_interval=0.5, max_interval=5.0, timeout=900):
+        # initial_interval / max_interval 只用于 wait 调用出错后的重试退避。
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._in_flight = 0
+        self._stats = {"submitted": 0, "succeeded": 0, "failed": 0, "polls": 0, "poll_errors": 0}
+        self._durations = []
+
+    def track_zone(self, project_id, zone, operation_name):
+        return self._track("zone", project_id, zone, operation_name)
+
+    def track_global(self, project_id, operation_name):
+        return self._track("global", project_id, None, operation_name)
+
+    def in_flight(self):
+        with self._lock:
+            return self._in_flight
+
+    def _track(self, scope, project_id, zone, operation_name):
+        entry = {
+            "scope": scope,
+            "project": project_id,
+            "zone": zone,
+            "operation": operation_name,
+            "future": Future(),
+            "started": time.monotonic(),
+        }
+        with self._lock:
+            self._in_flight += 1
+            self._stats["submitted"] += 1
+        # 守护线程: 退出程序时不必等待仍在长轮询的请求。
+        threading.Thread(target=self._watch, args=(entry,), name="operation-wait", daemon=True).start()
+        return entry["future"]
+
+    def _wait(self, entry):
+        if entry["scope"] == "zone":
+            client = get_client("ZoneOperationsClient")
+            return client.wait(project=entry["project"], zone=entry["zone"], operation=entry["operation"])
+        client = get_client("GlobalOperationsClient")
+        return client.wait(project=entry["project"], operation=entry["operation"])
+
+    def _watch(self, entry):
+        deadline = entry["started"] + self.timeout
+        interval = self.initial_interval
+        operation = error = None
+        with self._slots:
+            while True:
+                try:
+                    operation = self._wait(entry)
+                except Exception as e:
+                    with self._lock:
+                        self._stats["polls"] += 1
+                        self._stats["poll_errors"] += 1
+                    if is_not_found_error(e):
+                        error = e
+                        break
+                    if time.monotonic() >= deadline:
+                        error = OperationError(f"等待操作超时: {entry['operation']}")
+                        break
+                    time.sleep(interval * random.uniform(0.8, 1.2))
+                    interval = min(self.max_interval, interval * 1.6)
+                    continue
+                with self._lock:
+                    self._stats["polls"] += 1
+                if operation.status == compute_v1.Operation.Status.DONE:
+                    if operation.error:
+                        error = OperationError(operation_error_message(operation))
+                    break
+                # wait 到时未完成则继续下一次长轮询。
+                if time.monotonic() >= deadline:
+                    error = OperationError(f"等待操作超时: {entry['operation']}")
+                    break
+
+        self._finish(entry, operation, error)
+        if error is None:
+            entry["future"].set_result(operation)
+        else:
+            entry["future"].set_exception(error)
+
+    def _finish(self, entry, operation=None, error=None):
+        finished_at = time.monotonic()
+        if TRACE_ENABLED:
+            record_span(
+                "operation",
+                f"{entry['scope']}:{getattr(operation, 'operation_type', '') or 'operation'}",
+                entry["started"],
+                finished_at,
+                {"operation": entry["operation"], "project": entry["project"], "zone": entry.get("zone")},
+                error,
+                thread="operation-wait",
+            )
+        with self._lock:
+            self._in_flight -= 1
+            self._durations.append(finished_at - entry["started"])
+            self._stats["succeeded" if error is None else "failed"] += 1
+
+    def metrics(self):
+        with self._lock:
+            durations = list(self._durations)
+            stats = dict(self._stats, in_flight=self._in_flight)
+        stats["p50"] = percentile(durations, 50)
+        stats["p95"] = percentile(durations, 95)
+        return stats
+
+    def print_metrics(self):
+        stats = self.metrics()
+        if not stats["submitted"]:
+            return
+        print("\n--- 操作跟踪统计 ---")
+        print(
+            f"提交 {stats['submitted']} | 成功 {stats['succeeded']} | 失败 {stats['failed']} | "
+            f"进行中 {stats['in_flight']} | 等待请求 {stats['polls']} 次 (出错 {stats['poll_errors']})"
+        )
+        if stats["p50"] is not None:
+            print(f"完成耗时 p50 {stats['p50']:.1f}s | p95 {stats['p95']:.1f}s")
+
+
+OPERATIONS = OperationTracker()
+
+
 def wait_for_operation(project_id, zone, operation_name):
-    operation_client = compute_v1.ZoneOperationsClient()
-    return operation_client.wait(project=project_id, zone=zone, operation=operation_name)
+    return OPERATIONS.track_zone(project_id, zone, operation_name).result()
 
 
-def reroll_cpu_loop(project_id, instance_info):
-    instance_name = instance_info["name"]
-    zone = instance_info["zone"]
+def wait_for_global_operation(project_id, operation_name):
+    return OPERATIONS.track_global(project_id, operation_name).result()
 
-    instance_client = compute_v1.InstancesClient()
-    attempt_counter = 1
 
-    print_info(f"目标实例: {instance_name} ({zone})")
-    print_info("目标: 只要 CPU 包含 'AMD' 即停止。")
+def instance_label(instance_info):
+    return f"{instance_info['name']}@{instance_info['zone']}"
 
-    while True:
-        print("\n" + "=" * 50)
-        print_info(f"第 {attempt_counter} 次尝试...")
+
+PLATFORM_PROBE_TIMEOUT = 120
+PLATFORM_PROBE_MAX_INTERVAL = 10.0
+PLATFORM_TIMING_MIN_SAMPLES = 3
+PLATFORM_TIMING_BUCKETS = [1, 2, 5, 10, 20, 40, 80, PLATFORM_PROBE_TIMEOUT]
+
+_PLATFORM_TIMINGS = {}
+# 从 SQLite 载入的历史样本单独存放，只参与学习查询间隔，不计入本次运行的分布。
+_PLATFORM_TIMING_HISTORY = {}
+_PLATFORM_TIMINGS_LOCK = threading.Lock()
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def record_platform_timing(zone, seconds, probes):
+    with _PLATFORM_TIMINGS_LOCK:
+        _PLATFORM_TIMINGS.setdefault(zone, []).append((seconds, probes))
+
+
+def current_platform_timing(zone):
+    seed_platform_timings(zone)
+    with _PLATFORM_TIMINGS_LOCK:
+        samples = [sec for sec, _ in _PLATFORM_TIMING_HISTORY.get(zone, []) + _PLATFORM_TIMINGS.get(zone, [])]
+    if len(samples) < PLATFORM_TIMING_MIN_SAMPLES:
+        return {}
+    return {"p50": percentile(samples, 50), "p95": percentile(samples, 95)}
+
+
+REROLL_STATS_FILE = "reroll_stats.sqlite3"
+# AMD 概率的先验 (约 1/3)：用于平滑各区实测值，并在 rank_zones 中估计没有数据的可用区，保证新区域也有机会被尝试。
+REROLL_PRIOR_HITS = 1
+REROLL_PRIOR_ATTEMPTS = 3
+# 启动失败 (资源不足、配额等) 单独记录，不算作一次没刷到 AMD 的尝试。
+REROLL_START_FAILED = "START_FAILED"
+_STATS_LOCK = threading.Lock()
+_STATS_READY = set()
+_PLATFORM_TIMINGS_SEEDED = set()
+
+
+def open_stats_db():
+    path = cache_path(REROLL_STATS_FILE)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    if path not in _STATS_READY:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS reroll_attempts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL NOT NULL,
+                project TEXT NOT NULL,
+                zone TEXT NOT NULL,
+                instance TEXT NOT NULL,
+                strategy TEXT NOT NULL,
+                platform TEXT NOT NULL,
+                is_amd INTEGER NOT NULL,
+                platform_seconds REAL,
+                probes INTEGER,
+                cycle_seconds REAL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_reroll_attempts_zone ON reroll_attempts (zone, ts)")
+        conn.commit()
+        _STATS_READY.add(path)
+    return conn
+
+
+def record_reroll_attempt(project_id, zone, instance_name, strategy, platform, platform_seconds, probes, cycle_seconds):
+    # 统计写入失败不应影响刷 CPU 本身。
+    try:
+        with _STATS_LOCK:
+            conn = open_stats_db()
+            try:
+                conn.execute(
+                    "INSERT INTO reroll_attempts (ts, project, zone, instance, strategy, platform, is_amd, "
+                    "platform_seconds, probes, cycle_seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        time.time(),
+                        project_id,
+                        zone,
+                        instance_name,
+                        strategy,
+                        platform,
+                        int("AMD" in platform.upper()),
+                        platform_seconds,
+                        probes,
+                        cycle_seconds,
+                    ),
+                )
+                conn.commit()
+            finally:
+                conn.close()
+    except sqlite3.Error as e:
+        print_warning(f"记录刷 CPU 统计失败: {e}")
+
+
+def query_reroll_stats(sql, params=()):
+    with _STATS_LOCK:
+        conn = open_stats_db()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+
+def zone_reroll_stats(zones=None, strategy=None):
+    # 每个可用区: 尝试次数、AMD 次数、平均每轮耗时，以及预计刷到 AMD 的时间 = 平均每轮耗时 / AMD 概率。
+    sql = "SELECT zone, platform, is_amd, cycle_seconds FROM reroll_attempts"
+    params = []
+    if strategy:
+        sql += " WHERE strategy = ?"
+        params.append(strategy)
+    try:
+        rows = query_reroll_stats(sql, params)
+    except sqlite3.Error as e:
+        print_warning(f"读取刷 CPU 统计失败: {e}")
+        rows = []
+
+    stats = {}
+    for zone, platform, is_amd, cycle_seconds in rows:
+        if zones is not None and zone not in zones:
+            continue
+        entry = stats.setdefault(zone, {"zone": zone, "attempts": 0, "amd": 0, "start_failures": 0, "cycles": []})
+        if platform == REROLL_START_FAILED:
+            entry["start_failures"] += 1
+            continue
+        entry["attempts"] += 1
+        entry["amd"] += is_amd
+        if cycle_seconds is not None:
+            entry["cycles"].append(cycle_seconds)
+
+    for entry in stats.values():
+        entry["amd_rate"] = (entry["amd"] + REROLL_PRIOR_HITS) / (entry["attempts"] + REROLL_PRIOR_ATTEMPTS)
+        entry["avg_cycle"] = sum(entry["cycles"]) / len(entry["cycles"]) if entry["cycles"] else None
+        entry["expected"] = entry["avg_cycle"] / entry["amd_rate"] if entry["avg_cycle"] is not None else None
+    return stats
+
+
+def rank_zones(zones):
+    # 按预计耗时 (平均每轮 / AMD 概率) 升序排列。没有数据的可用区用先验概率和已知区域的平均每轮耗时估计，
+    # 这样先验更乐观的新区域可以排到实测较差的区域前面；完全没有耗时数据时保持原顺序。
+    stats = zone_reroll_stats(set(zones))
+    order = {zone: i for i, zone in enumerate(zones)}
+    known_cycles = [entry["avg_cycle"] for entry in stats.values() if entry["avg_cycle"] is not None]
+    typical_cycle = sum(known_cycles) / len(known_cycles) if known_cycles else None
+
+    def estimate(zone):
+        entry = stats.get(zone)
+        if entry is not None and entry["expected"] is not None:
+            return entry["expected"]
+        if typical_cycle is None:
+            return None
+        amd_rate = entry["amd_rate"] if entry is not None else REROLL_PRIOR_HITS / REROLL_PRIOR_ATTEMPTS
+        return typical_cycle / amd_rate
+
+    estimates = {zone: estimate(zone) for zone in zones}
+    ranked = sorted(zones, key=lambda zone: (estimates[zone] is None, estimates[zone] or 0, order[zone]))
+    return ranked, stats
+
+
+REROLL_STRATEGIES = ("stop_start", "recreate")
+REROLL_STRATEGY_LABELS = {"stop_start": "关机/开机", "recreate": "删除重建"}
+# 每种重置方式在一个可用区先各跑这么多轮，之后固定用平均每轮更快的那种。
+REROLL_STRATEGY_MIN_SAMPLES = 3
+
+
+def strategy_cycle_stats(zone=None):
+    sql = (
+        "SELECT zone, strategy, COUNT(*), AVG(cycle_seconds) FROM reroll_attempts "
+        "WHERE cycle_seconds IS NOT NULL AND platform != ?"
+    )
+    params = [REROLL_START_FAILED]
+    if zone:
+        sql += " AND zone = ?"
+        params.append(zone)
+    sql += " GROUP BY zone, strategy"
+    try:
+        rows = query_reroll_stats(sql, params)
+    except sqlite3.Error as e:
+        print_warning(f"读取刷 CPU 统计失败: {e}")
+        rows = []
+    stats = {}
+    for zone_name, strategy, count, avg_cycle in rows:
+        stats.setdefault(zone_name, {})[strategy] = {"count": count, "avg_cycle": avg_cycle}
+    return stats
+
+
+def choose_reroll_strategy(zone, stats=None):
+    samples = (stats if stats is not None else strategy_cycle_stats(zone)).get(zone, {})
+    counts = {strategy: samples.get(strategy, {}).get("count", 0) for strategy in REROLL_STRATEGIES}
+    exploring = [strategy for strategy in REROLL_STRATEGIES if counts[strategy] < REROLL_STRATEGY_MIN_SAMPLES]
+    if exploring:
+        return min(exploring, key=lambda strategy: counts[strategy])
+    return min(REROLL_STRATEGIES, key=lambda strategy: samples[strategy]["avg_cycle"])
+
+
+def format_zone_stats(entry):
+    if not entry:
+        return "暂无刷 CPU 记录"
+    parts = [f"AMD {entry['amd']}/{entry['attempts']}"]
+    if entry["start_failures"]:
+        parts.append(f"启动失败 {entry['start_failures']} 次")
+    if entry["avg_cycle"] is not None:
+        parts.append(f"每轮约 {format_duration(entry['avg_cycle'])}")
+    if entry["expected"] is not None:
+        parts.append(f"预计 {format_duration(entry['expected'])} 刷到 AMD")
+    return ", ".join(parts)
+
+
+def print_zone_reroll_stats():
+    stats = zone_reroll_stats()
+    if not stats:
+        print_info("暂无刷 CPU 记录。")
+        return
+    ranked, _ = rank_zones(sorted(stats))
+    print(f"\n--- 各可用区刷 CPU 统计 ({cache_path(REROLL_STATS_FILE)}) ---")
+    print(
+        f"{'可用区':<16} {'尝试':>5} {'AMD':>5} {'AMD率':>7} {'平均每轮':>10} {'预计耗时':>10} {'启动失败':>8}"
+    )
+    for zone in ranked:
+        entry = stats[zone]
+        avg_cycle = format_duration(entry["avg_cycle"]) if entry["avg_cycle"] is not None else "-"
+        expected = format_duration(entry["expected"]) if entry["expected"] is not None else "-"
+        amd_rate = f"{entry['amd'] / entry['attempts']:.0%}" if entry["attempts"] else "-"
+        print(
+            f"{zone:<19} {entry['attempts']:>5} {entry['amd']:>5} {amd_rate:>8} "
+            f"{avg_cycle:>12} {expected:>12} {entry['start_failures']:>10}"
+        )
+    try:
+        rows = query_reroll_stats(
+            "SELECT platform, COUNT(*) FROM reroll_attempts WHERE platform != ? "
+            "GROUP BY platform ORDER BY COUNT(*) DESC",
+            (REROLL_START_FAILED,),
+        )
+    except sqlite3.Error:
+        rows = []
+    if rows:
+        print("CPU 平台分布: " + " | ".join(f"{platform} {count}" for platform, count in rows))
+
+    cycle_stats = strategy_cycle_stats()
+    if cycle_stats:
+        print("\n--- 重置方式对比 (平均每轮耗时) ---")
+        for zone in ranked:
+            if zone not in cycle_stats:
+                continue
+            parts = [
+                f"{REROLL_STRATEGY_LABELS.get(strategy, strategy)} {item['count']} 轮 {format_duration(item['avg_cycle'])}"
+                for strategy, item in sorted(cycle_stats[zone].items())
+            ]
+            chosen = REROLL_STRATEGY_LABELS[choose_reroll_strategy(zone, cycle_stats)]
+            print(f"{zone:<19} {' | '.join(parts)}  -> 自动模式: {chosen}")
+
+
+def seed_platform_timings(zone, limit=50):
+    # 启动后 CPU 信息出现的时间分布先用历史记录填充，新会话的第一次刷新就能按学习到的间隔查询。
+    with _PLATFORM_TIMINGS_LOCK:
+        if zone in _PLATFORM_TIMINGS_SEEDED:
+            return
+        _PLATFORM_TIMINGS_SEEDED.add(zone)
+    try:
+        rows = query_reroll_stats(
+            "SELECT platform_seconds, probes FROM reroll_attempts WHERE zone = ? AND platform_seconds IS NOT NULL "
+            "ORDER BY ts DESC LIMIT ?",
+            (zone, limit),
+        )
+    except sqlite3.Error:
+        return
+    if not rows:
+        return
+    with _PLATFORM_TIMINGS_LOCK:
+        _PLATFORM_TIMING_HISTORY[zone] = [(seconds, probes or 1) for seconds, probes in reversed(rows)]
+
+
+def next_platform_probe_delay(probe_index, learned):
+    # 第一次查询安排在历史 p50 附近，之后以带抖动的指数退避逼近 p95。
+    if probe_index == 0:
+        return learned.get("p50", 0.0) * random.uniform(0.8, 1.0) if learned else 0.0
+    base = min(PLATFORM_PROBE_MAX_INTERVAL, 0.5 * (2 ** probe_index))
+    if learned and probe_index == 1:
+        base = max(0.5, min(base, learned["p95"] - learned["p50"]))
+    return random.uniform(base / 2, base)
+
+
+def wait_for_cpu_platform(
+    instance_client,
+    project_id,
+    zone,
+    instance_name,
+    learned=None,
+    log_prefix="",
+    pause=time.sleep,
+    cancelled=lambda: False,
+):
+    # learned 为 None 表示实例本就在运行，无需等待启动，直接查询一次。
+    signal_at = time.monotonic()
+    deadline = signal_at + PLATFORM_PROBE_TIMEOUT
+    probes = 0
+    next_notice = 15
+
+    while not cancelled():
+        delay = next_platform_probe_delay(probes, learned) if learned is not None else 0.0
+        delay = min(delay, max(0.0, deadline - time.monotonic()))
+        if delay > 0:
+            pause(delay)
+        if cancelled():
+            break
 
         current_inst = instance_client.get(project=project_id, zone=zone, instance=instance_name)
+        probes += 1
+        elapsed = time.monotonic() - signal_at
+
         if current_inst.status != "RUNNING":
-            print_info(f"正在启动虚拟机 {instance_name}...")
-            op = instance_client.start(project=project_id, zone=zone, instance=instance_name)
-            wait_for_operation(project_id, zone, op.name)
-            print_info("虚拟机已通电，正在等待系统初始化...")
+            print_warning(f"{log_prefix}检测到虚拟机状态异常变为: {current_inst.status}。跳过本次检测。")
+            return "Instability Detected", elapsed, probes
+
+        platform = current_inst.cpu_platform
+        if platform and platform != "Unknown CPU Platform":
+            return platform, elapsed, probes
+
+        if time.monotonic() >= deadline:
+            break
+        if learned is None:
+            learned = current_platform_timing(zone)
+        if elapsed >= next_notice:
+            print_info(f"{log_prefix}正在等待 CPU 元数据同步... (已等待 {int(elapsed)}s, 查询 {probes} 次) - 机器正在启动中")
+            next_notice += 15
+
+    return "Unknown CPU Platform", time.monotonic() - signal_at, probes
+
+
+def print_platform_timing_histogram():
+    with _PLATFORM_TIMINGS_LOCK:
+        snapshot = {zone: list(samples) for zone, samples in _PLATFORM_TIMINGS.items()}
+    if not snapshot:
+        return
+
+    print("\n--- 本次运行 CPU 平台检测耗时分布（从启动完成开始计时） ---")
+    for zone in sorted(snapshot):
+        samples = snapshot[zone]
+        seconds = [sec for sec, _ in samples]
+        avg_probes = sum(p for _, p in samples) / len(samples)
+        print(
+            f"{zone}: 样本 {len(samples)} | p50 {percentile(seconds, 50):.1f}s | "
+            f"p95 {percentile(seconds, 95):.1f}s | 平均查询 {avg_probes:.1f} 次"
+        )
+        lower = 0
+        for upper in PLATFORM_TIMING_BUCKETS:
+            count = sum(1 for sec in seconds if lower <= sec < upper)
+            if upper == PLATFORM_TIMING_BUCKETS[-1]:
+                count += sum(1 for sec in seconds if sec >= upper)
+            if count:
+                print(f"  {lower:>4}-{upper:<4}s {'#' * count} {count}")
+            lower = upper
+
+
+RECREATE_INSERT_RETRIES = 5
+RECREATE_RETRY_DELAY = 10
+
+
+# 原样复制到重建实例的字段；磁盘、网卡和元数据单独处理。
+RECREATE_COPY_FIELDS = (
+    "description",
+    "labels",
+    "service_accounts",
+    "scheduling",
+    "shielded_instance_config",
+    "min_cpu_platform",
+    "can_ip_forward",
+    "hostname",
+    "guest_accelerators",
+    "advanced_machine_features",
+    "confidential_instance_config",
+    "reservation_affinity",
+    "display_device",
+)
+
+
+def recreate_template(inst):
+    # 只支持单块启动盘: 删除实例时其它 auto_delete 的数据盘会被一并删除。
+    if len(inst.disks) != 1 or not inst.disks[0].boot or not inst.disks[0].source:
+        raise RuntimeError("实例挂载了多块磁盘或没有可重新挂载的启动盘")
+    boot_disk = inst.disks[0]
+    metadata = getattr(inst, "metadata", None)
+    return {
+        "name": inst.name,
+        "machine_type": inst.machine_type,
+        "disk_source": boot_disk.source,
+        "device_name": boot_disk.device_name,
+        "network_interfaces": [
+            {
+                "network": nic.network or "global/networks/default",
+                "subnetwork": getattr(nic, "subnetwork", ""),
+                "network_ip": nic.network_i_p,
+                "access_configs": [
+                    {
+                        "name": access_config.name,
+                        "type": access_config.type_,
+                        "network_tier": access_config.network_tier,
+                        "nat_ip": access_config.nat_i_p,
+                    }
+                    for access_config in nic.access_configs
+                ],
+            }
+            for nic in inst.network_interfaces
+        ],
+        "tags": list(inst.tags.items) if inst.tags else [],
+        "metadata_items": list(metadata.items) if metadata and metadata.items else [],
+        "fields": {field: getattr(inst, field) for field in RECREATE_COPY_FIELDS if getattr(inst, field, None)},
+    }
+
+
+def is_reserved_address(project_id, zone, address):
+    address_client = get_client("AddressesClient")
+    region = zone.rsplit("-", 1)[0]
+    request = compute_v1.ListAddressesRequest(project=project_id, region=region, filter=f'address = "{address}"')
+    return any(True for _ in address_client.list(request=request))
+
+
+def build_recreate_network_interface(nic):
+    network_interface = compute_v1.NetworkInterface()
+    network_interface.network = nic["network"]
+    if nic["subnetwork"]:
+        network_interface.subnetwork = nic["subnetwork"]
+    if nic["network_ip"]:
+        network_interface.network_i_p = nic["network_ip"]
+    access_configs = []
+    for item in nic["access_configs"]:
+        access_config = compute_v1.AccessConfig()
+        access_config.name = item["name"] or "External NAT"
+        access_config.type_ = item["type"] or compute_v1.AccessConfig.Type.ONE_TO_ONE_NAT.name
+        if item["network_tier"]:
+            access_config.network_tier = item["network_tier"]
+        if item["nat_ip"]:
+            access_config.nat_i_p = item["nat_ip"]
+        access_configs.append(access_config)
+    # 原实例没有外网 IP 时保持没有。
+    network_interface.access_configs = access_configs
+    return network_interface
+
+
+def build_recreate_resource(template):
+    # 启动盘保持 auto_delete=False，后续每轮重建都不必再单独调用 setDiskAutoDelete。
+    disk = compute_v1.AttachedDisk()
+    disk.boot = True
+    disk.auto_delete = False
+    disk.source = template["disk_source"]
+    disk.device_name = template["device_name"]
+
+    instance = compute_v1.Instance()
+    instance.name = template["name"]
+    instance.machine_type = template["machine_type"]
+    instance.disks = [disk]
+    instance.network_interfaces = [build_recreate_network_interface(nic) for nic in template["network_interfaces"]]
+    if template["tags"]:
+        tags = compute_v1.Tags()
+        tags.items = template["tags"]
+        instance.tags = tags
+    if template["metadata_items"]:
+        metadata = compute_v1.Metadata()
+        metadata.items = template["metadata_items"]
+        instance.metadata = metadata
+    for field, value in template["fields"].items():
+        setattr(instance, field, value)
+    return instance
+
+
+def set_boot_disk_auto_delete(project_id, zone, template, auto_delete):
+    instance_client = get_client("InstancesClient")
+    op = instance_client.set_disk_auto_delete(
+        project=project_id,
+        zone=zone,
+        instance=template["name"],
+        auto_delete=auto_delete,
+        device_name=template["device_name"],
+    )
+    wait_for_operation(project_id, zone, op.name)
+
+
+def prepare_recreate(project_id, zone, instance_name):
+    instance_client = get_client("InstancesClient")
+    inst = instance_client.get(project=project_id, zone=zone, instance=instance_name)
+    template = recreate_template(inst)
+    # 静态外网 IP 重建后继续使用；临时 IP 删除实例时即释放，和关机/开机一样会变化。
+    for nic in template["network_interfaces"]:
+        for access_config in nic["access_configs"]:
+            if access_config["nat_ip"] and not is_reserved_address(project_id, zone, access_config["nat_ip"]):
+                access_config["nat_ip"] = ""
+    set_boot_disk_auto_delete(project_id, zone, template, False)
+    return template
+
+
+def recreate_instance_keep_disk(project_id, zone, template, log_prefix="", pause=time.sleep):
+    instance_client = get_client("InstancesClient")
+    disk_name = template["disk_source"].split("/")[-1]
+    print_info(f"{log_prefix}正在删除虚拟机 {template['name']} (保留启动盘 {disk_name})...")
+    try:
+        op = instance_client.delete(project=project_id, zone=zone, instance=template["name"])
+        wait_for_operation(project_id, zone, op.name)
+
+        # 实例已删除，重建失败 (如可用区资源不足) 只能重试，不能半途放弃。
+        for attempt in range(1, RECREATE_INSERT_RETRIES + 1):
+            print_info(f"{log_prefix}正在用启动盘 {disk_name} 重建虚拟机...")
+            try:
+                op = instance_client.insert(
+                    project=project_id, zone=zone, instance_resource=build_recreate_resource(template)
+                )
+                wait_for_operation(project_id, zone, op.name)
+                return
+            except Exception as e:
+                error = describe_api_error(e)
+                if attempt == RECREATE_INSERT_RETRIES:
+                    raise RuntimeError(f"重建失败: {error}。启动盘 {disk_name} 已保留，可用它手动重建实例")
+                print_warning(f"{log_prefix}重建失败: {error}。{RECREATE_RETRY_DELAY} 秒后重试...")
+                pause(RECREATE_RETRY_DELAY)
+    except KeyboardInterrupt:
+        # Ctrl+C 可能发生在删除之后、重建之前。
+        print_warning(
+            f"{log_prefix}删除重建被中断，实例可能已被删除。启动盘 {disk_name} 已保留，可用它手动重建实例。"
+        )
+        raise
 
-        current_platform = "Unknown CPU Platform"
-        max_retries = 60
 
-        for i in range(max_retries):
-            current_inst = instance_client.get(project=project_id, zone=zone, instance=instance_name)
+def reroll_until_amd(project_id, instance_info, log_prefix="", stop_event=None, strategy="stop_start"):
+    instance_name = instance_info["name"]
+    zone = instance_info["zone"]
 
-            if current_inst.status != "RUNNING":
-                print_warning(f"检测到虚拟机状态异常变为: {current_inst.status}。跳过本次检测。")
-                current_platform = "Instability Detected"
+    instance_client = get_client("InstancesClient")
+    attempt_counter = 1
+    started_at = time.monotonic()
+    result = {
+        "instance": instance_label(instance_info),
+        "attempts": 0,
+        "platform": "Unknown CPU Platform",
+        "success": False,
+        "cancelled": False,
+        "error": None,
+        "elapsed": 0.0,
+    }
+
+    def cancelled():
+        return stop_event is not None and stop_event.is_set()
+
+    def pause(seconds):
+        if stop_event is not None:
+            stop_event.wait(seconds)
+        else:
+            time.sleep(seconds)
+
+    # 每轮耗时从上一轮开始重置 (关机或删除) 算起，到拿到 CPU 信息为止。
+    cycle_started = time.monotonic()
+    cycle_strategy = "stop_start"
+    # 第一轮若是直接启动已关机的实例，不含关机或删除耗时，不计入每轮耗时。
+    cycle_reset = False
+    # 删除重建模式下记录的实例配置；非空表示启动盘已改为保留，结束时需要恢复。
+    template = None
+    recreated = False
+
+    def record_attempt(platform, platform_seconds=None, probes=None, power_cycled=True):
+        cycle_seconds = time.monotonic() - cycle_started if power_cycled and cycle_reset else None
+        record_reroll_attempt(
+            project_id, zone, instance_name, cycle_strategy, platform, platform_seconds, probes, cycle_seconds
+        )
+
+    def pick_strategy():
+        nonlocal strategy, template
+        if strategy == "stop_start":
+            return "stop_start"
+        chosen = choose_reroll_strategy(zone) if strategy == "auto" else strategy
+        if chosen == "recreate" and template is None:
+            try:
+                template = prepare_recreate(project_id, zone, instance_name)
+            except Exception as e:
+                print_warning(f"{log_prefix}无法使用删除重建: {e}。改用关机/开机。")
+                strategy = "stop_start"
+                return "stop_start"
+        if strategy == "auto":
+            print_info(f"{log_prefix}本轮重置方式: {REROLL_STRATEGY_LABELS[chosen]}")
+        return chosen
+
+    try:
+        while not cancelled():
+            result["attempts"] = attempt_counter
+            if not log_prefix:
+                print("\n" + "=" * 50)
+            print_info(f"{log_prefix}第 {attempt_counter} 次尝试...")
+
+            if recreated:
+                # 重建请求完成时实例已在运行，省去一次查询和开机。
+                recreated = False
+                print_info(f"{log_prefix}虚拟机已重建，正在等待系统初始化...")
+                learned = current_platform_timing(zone)
+            else:
+                current_inst = instance_client.get(project=project_id, zone=zone, instance=instance_name)
+                if current_inst.status != "RUNNING":
+                    print_info(f"{log_prefix}正在启动虚拟机 {instance_name}...")
+                    op = instance_client.start(project=project_id, zone=zone, instance=instance_name)
+                    try:
+                        wait_for_operation(project_id, zone, op.name)
+                    except OperationError as e:
+                        # 可用区资源不足等启动失败属于常见情况，稍后重试而不是中止。
+                        print_warning(f"{log_prefix}启动失败: {e}。10 秒后重试...")
+                        record_attempt(REROLL_START_FAILED)
+                        cycle_started = time.monotonic()
+                        attempt_counter += 1
+                        pause(10)
+                        continue
+                    print_info(f"{log_prefix}虚拟机已通电，正在等待系统初始化...")
+                    learned = current_platform_timing(zone)
+                else:
+                    learned = None
+
+            with trace_span("poll", "wait_for_cpu_platform", zone=zone, instance=instance_name):
+                current_platform, detect_seconds, probes = wait_for_cpu_platform(
+                    instance_client,
+                    project_id,
+                    zone,
+                    instance_name,
+                    learned=learned,
+                    log_prefix=log_prefix,
+                    pause=pause,
+                    cancelled=cancelled,
+                )
+            if current_platform not in ("Unknown CPU Platform", "Instability Detected") and learned is not None:
+                record_platform_timing(zone, detect_seconds, probes)
+            if not cancelled():
+                if learned is not None:
+                    detected = current_platform not in ("Unknown CPU Platform", "Instability Detected")
+                    record_attempt(current_platform, detect_seconds if detected else None, probes)
+                else:
+                    record_attempt(current_platform or "Unknown CPU Platform", power_cycled=False)
+
+            result["platform"] = current_platform or "Unknown CPU Platform"
+            if current_platform == "Unknown CPU Platform":
+                print_warning(f"{log_prefix}超时：等待 2 分钟后仍无法获取 CPU 信息。")
+            elif current_platform != "Instability Detected":
+                print_info(f"{log_prefix}检测到 CPU: {current_platform} (耗时 {detect_seconds:.1f}s, 查询 {probes} 次)")
+
+            if "AMD" in str(current_platform).upper():
+                result["success"] = True
+                print_success(f"{log_prefix}恭喜！已成功刷到目标 CPU: {current_platform}")
                 break
 
-            current_platform = current_inst.cpu_platform
-            if current_platform and current_platform != "Unknown CPU Platform":
+            if cancelled():
                 break
 
-            if (i + 1) % 5 == 0:
-                print_info(f"正在等待 CPU 元数据同步... ({i+1}/{max_retries}) - 机器正在启动中")
-            time.sleep(2)
+            print_warning(f"{log_prefix}结果不满意 ({current_platform})。准备重置...")
+            cycle_strategy = pick_strategy()
+            cycle_started = time.monotonic()
+            cycle_reset = True
+            if cycle_strategy == "recreate":
+                recreate_instance_keep_disk(project_id, zone, template, log_prefix=log_prefix, pause=pause)
+                recreated = True
+                attempt_counter += 1
+                continue
+            print_info(f"{log_prefix}正在关停虚拟机 {instance_name}...")
+            op = instance_client.stop(project=project_id, zone=zone, instance=instance_name)
+            wait_for_operation(project_id, zone, op.name)
+            attempt_counter += 1
+            pause(2)
+    except Exception as e:
+        result["error"] = str(e)
+        print_warning(f"{log_prefix}刷 CPU 中止: {e}")
+    finally:
+        if template is not None:
+            # 恢复与 create_instance 一致的行为: 删除实例时一并删除启动盘。
+            try:
+                set_boot_disk_auto_delete(project_id, zone, template, True)
+            except Exception as e:
+                disk_name = template["disk_source"].split("/")[-1]
+                print_warning(
+                    f"{log_prefix}恢复启动盘自动删除失败: {e}。磁盘 {disk_name} 不会随实例删除，请手动清理。"
+                )
+
+    result["cancelled"] = not result["success"] and result["error"] is None and cancelled()
+    result["elapsed"] = time.monotonic() - started_at
+    result["instance_info"] = refresh_instance(project_id, zone, instance_name)
+    return result
+
 
-        if current_platform == "Unknown CPU Platform":
-            print_warning("超时：等待 2 分钟后仍无法获取 CPU 信息。")
+def select_reroll_strategy():
+    print("重置方式: [1] 自动 (按可用区历史耗时选更快的)  [2] 关机/开机  [3] 删除重建 (保留启动盘)")
+    return {"2": "stop_start", "3": "recreate"}.get(input("请输入数字选择 (默认 1): ").strip(), "auto")
+
+
+def reroll_cpu_loop(project_id, instance_info, strategy=None):
+    print_info(f"目标实例: {instance_info['name']} ({instance_info['zone']})")
+    print_info("目标: 只要 CPU 包含 'AMD' 即停止。")
+
+    result = reroll_until_amd(project_id, instance_info, strategy=strategy or select_reroll_strategy())
+    print_platform_timing_histogram()
+    if result["success"]:
+        print_info("脚本执行完毕。")
+    return result
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m{seconds:02d}s"
+    if minutes:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{seconds}s"
+
+
+def print_reroll_summary(results):
+    print("\n--- 刷 CPU 结果汇总 ---")
+    print(f"{'实例':<36} {'结果':<8} {'尝试次数':>8} {'耗时':>10}  CPU")
+    for res in results:
+        if res["success"]:
+            status = "成功"
+        elif res["error"]:
+            status = "失败"
+        elif res["cancelled"]:
+            status = "已取消"
         else:
-            print_info(f"检测到 CPU: {current_platform}")
+            status = "未完成"
+        print(
+            f"{res['instance']:<36} {status:<8} {res['attempts']:>8} "
+            f"{format_duration(res['elapsed']):>10}  {res['platform']}"
+        )
+        if res["error"]:
+            print(f"    错误: {res['error']}")
 
-        if "AMD" in str(current_platform).upper():
-            print_success(f"恭喜！已成功刷到目标 CPU: {current_platform}")
-            print_info("脚本执行完毕。")
-            break
 
-        print_warning(f"结果不满意 ({current_platform})。准备重置...")
-        print_info(f"正在关停虚拟机 {instance_name}...")
-        op = instance_client.stop(project=project_id, zone=zone, instance=instance_name)
-        wait_for_operation(project_id, zone, op.name)
-        attempt_counter += 1
-        time.sleep(2)
+def reroll_cpu_parallel(project_id, instance_infos, max_workers=3, stop_on_first=False, strategy="auto"):
+    stop_event = threading.Event()
+    results = []
+
+    print_info(f"并发刷 CPU: 共 {len(instance_infos)} 台实例，并发上限 {max_workers}。")
+    if stop_on_first:
+        print_info("对冲模式: 任一实例刷到 AMD 后，其余实例将停止刷新。")
+
+    def worker(instance_info):
+        res = reroll_until_amd(
+            project_id,
+            instance_info,
+            log_prefix=f"[{instance_label(instance_info)}] ",
+            stop_event=stop_event,
+            strategy=strategy,
+        )
+        if res["success"] and stop_on_first:
+            stop_event.set()
+        return res
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(worker, inst) for inst in instance_infos]
+        try:
+            for future in as_completed(futures):
+                results.append(future.result())
+        except KeyboardInterrupt:
+            stop_event.set()
+            print_warning("收到中断信号，正在等待各实例当前步骤结束...")
+            for future in futures:
+                future.cancel()
+            raise
+
+    order = {instance_label(inst): i for i, inst in enumerate(instance_infos)}
+    results.sort(key=lambda r: order.get(r["instance"], 0))
+    print_reroll_summary(results)
+    print_platform_timing_histogram()
+    return results
+
+
+def prompt_positive_int(prompt_text, default):
+    while True:
+        value = input(f"{prompt_text} (默认 {default}): ").strip()
+        if not value:
+            return default
+        if value.isdigit() and int(value) > 0:
+            return int(value)
+        print("输入无效，请重试。")
+
+
+def reroll_cpu_menu(project_id):
+    instance_infos = select_instances(project_id)
+    if not instance_infos:
+        return
+    max_workers = prompt_positive_int("请输入并发上限", min(len(instance_infos), 3))
+    hedge = input("任一实例刷到 AMD 后是否停止其余实例 (对冲模式)? (y/N): ").strip().lower()
+    strategy = select_reroll_strategy()
+    reroll_cpu_parallel(
+        project_id, instance_infos, max_workers=max_workers, stop_on_first=hedge == "y", strategy=strategy
+    )
 
 
 def read_cdn_ips(filename="cdnip.txt"):
@@ -375,70 +2026,223 @@ def set_protocol_field(config_object, value):
             raise
 
 
+def get_protocol_field(config_object):
+    value = getattr(config_object, "ip_protocol", None)
+    if value is None:
+        value = getattr(config_object, "I_p_protocol", "")
+    return value
+
+
+def firewall_rule_spec(name, direction, priority, network, ip_ranges, action, protocol="all"):
+    return {
+        "name": name,
+        "direction": direction,
+        "priority": priority,
+        "network": network,
+        "ranges": sorted(ip_ranges),
+        "action": action,
+        "protocol": protocol,
+    }
+
+
+def firewall_rule_state(rule):
+    # 把线上规则转换成与 firewall_rule_spec 同构的字典，便于直接比较。
+    ranges = rule.source_ranges if rule.direction == "INGRESS" else rule.destination_ranges
+    action = "allowed" if rule.allowed else "denied"
+    configs = rule.allowed if rule.allowed else rule.denied
+    return firewall_rule_spec(
+        rule.name,
+        rule.direction,
+        rule.priority,
+        rule.network,
+        list(ranges),
+        action,
+        ",".join(sorted(get_protocol_field(config) for config in configs)),
+    )
+
+
+def build_firewall_rule(spec):
+    firewall_rule = compute_v1.Firewall()
+    firewall_rule.name = spec["name"]
+    firewall_rule.direction = spec["direction"]
+    firewall_rule.network = spec["network"]
+    firewall_rule.priority = spec["priority"]
+    if spec["direction"] == "INGRESS":
+        firewall_rule.source_ranges = spec["ranges"]
+    else:
+        firewall_rule.destination_ranges = spec["ranges"]
+
+    config = compute_v1.Allowed() if spec["action"] == "allowed" else compute_v1.Denied()
+    set_protocol_field(config, spec["protocol"])
+    setattr(firewall_rule, spec["action"], [config])
+    return firewall_rule
+
+
+def rule_in_scope(name, prefixes):
+    # 只认本工具生成的名字: 基础名或 "基础名-<数字>" 分片；用户自建的同前缀规则不动。
+    for prefix in prefixes:
+        suffix = name[len(prefix) + 1:]
+        if name == prefix or (name.startswith(f"{prefix}-") and suffix.isascii() and suffix.isdigit()):
+            return True
+    return False
+
+
+def plan_firewall_changes(existing_rules, desired_specs, scope):
+    # scope 为本次负责管理的规则基础名 (含其编号分片)，范围外的规则一律不动。
+    desired = {spec["name"]: spec for spec in desired_specs}
+    current = {}
+    for rule in existing_rules:
+        if rule.name in desired or rule_in_scope(rule.name, scope):
+            current[rule.name] = firewall_rule_state(rule)
+
+    changes = {"create": [], "patch": [], "replace": [], "delete": [], "unchanged": []}
+    for name, spec in desired.items():
+        state = current.get(name)
+        if state is None:
+            changes["create"].append(spec)
+            continue
+        wanted = dict(spec, network=spec["network"].rstrip("/").split("/")[-1])
+        actual = dict(state, network=state["network"].rstrip("/").split("/")[-1])
+        if wanted == actual:
+            changes["unchanged"].append(name)
+        elif any(wanted[key] != actual[key] for key in ("network", "direction", "action")):
+            # 网络、方向、动作不能原地修改，只能删除后重建。
+            changes["replace"].append(spec)
+        else:
+            changes["patch"].append(spec)
+    changes["delete"] = sorted(name for name in current if name not in desired)
+    return changes
+
+
+def reconcile_firewall(project_id, desired_specs, scope, max_workers=8):
+    firewall_client = get_client("FirewallsClient")
+    try:
+        existing = list(firewall_client.list(project=project_id))
+    except Exception as e:
+        print(f"【失败】列出防火墙规则失败: {describe_api_error(e)}")
+        return False
+
+    changes = plan_firewall_changes(existing, desired_specs, scope)
+    print_info(
+        f"防火墙对账: 新建 {len(changes['create'])} / 更新 {len(changes['patch'])} / "
+        f"重建 {len(changes['replace'])} / 删除 {len(changes['delete'])} / 无变化 {len(changes['unchanged'])}"
+    )
+
+    def create(spec):
+        op = firewall_client.insert(project=project_id, firewall_resource=build_firewall_rule(spec))
+        wait_for_global_operation(project_id, op.name)
+
+    def patch(spec):
+        op = firewall_client.patch(
+            project=project_id, firewall=spec["name"], firewall_resource=build_firewall_rule(spec)
+        )
+        wait_for_global_operation(project_id, op.name)
+
+    def delete(name):
+        try:
+            op = firewall_client.delete(project=project_id, firewall=name)
+            wait_for_global_operation(project_id, op.name)
+        except Exception as e:
+            if not is_not_found_error(e):
+                raise
+
+    def replace(spec):
+        delete(spec["name"])
+        create(spec)
+
+    tasks = (
+        [("新建", spec["name"], create, spec) for spec in changes["create"]]
+        + [("更新", spec["name"], patch, spec) for spec in changes["patch"]]
+        + [("重建", spec["name"], replace, spec) for spec in changes["replace"]]
+        + [("删除", name, delete, name) for name in changes["delete"]]
+    )
+    if not tasks:
+        print_success("防火墙规则已是最新，无需变更。")
+        return True
+
+    all_ok = True
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+        futures = {executor.submit(fn, arg): (action, name) for action, name, fn, arg in tasks}
+        for future in as_completed(futures):
+            action, name = futures[future]
+            if future.exception() is None:
+                print_line(f"  [{action}] {name} 完成")
+            else:
+                all_ok = False
+                print_line(f"【失败】[{action}] {name}: {describe_api_error(future.exception())}")
+    return all_ok
+
+
 def add_allow_all_ingress(project_id, network):
-    firewall_client = compute_v1.FirewallsClient()
     rule_name = "allow-all-ingress-custom"
+    print(f"\n正在同步入站规则: {rule_name} ...")
+    spec = firewall_rule_spec(rule_name, "INGRESS", 1000, network, ["0.0.0.0/0"], "allowed")
+    if not reconcile_firewall(project_id, [spec], [rule_name]):
+        return False
+    print_success("允许所有入站连接的规则已就绪。")
+    return True
+
 
-    print(f"\n正在创建入站规则: {rule_name} ...")
+def collapse_cidrs(entries):
+    # 按地址族分别合并相邻/重叠网段，主机位不为 0 的写法自动规整为网段。
+    networks = {4: set(), 6: set()}
+    invalid = []
+    for entry in entries:
+        try:
+            net = ipaddress.ip_network(entry, strict=False)
+        except ValueError:
+            invalid.append(entry)
+            continue
+        networks[net.version].add(net)
+    if invalid:
+        print_warning(f"忽略 {len(invalid)} 个无法解析的条目: {', '.join(invalid[:5])}{' ...' if len(invalid) > 5 else ''}")
+    return {version: list(ipaddress.collapse_addresses(nets)) for version, nets in networks.items()}
 
-    firewall_rule = compute_v1.Firewall()
-    firewall_rule.name = rule_name
-    firewall_rule.direction = "INGRESS"
-    firewall_rule.network = network
-    firewall_rule.priority = 1000
-    firewall_rule.source_ranges = ["0.0.0.0/0"]
 
-    allow_config = compute_v1.Allowed()
-    set_protocol_field(allow_config, "all")
-    firewall_rule.allowed = [allow_config]
+def shard_cidrs(collapsed, size=FIREWALL_MAX_RANGES_PER_RULE):
+    # 同一条规则不能混用 IPv4 与 IPv6，按地址族分别切片。
+    shards = []
+    for version in (4, 6):
+        nets = [str(net) for net in collapsed.get(version, [])]
+        for start in range(0, len(nets), size):
+            shards.append(nets[start:start + size])
+    return shards
 
-    try:
-        operation = firewall_client.insert(project=project_id, firewall_resource=firewall_rule)
-        print("正在应用规则...")
-        operation_client = compute_v1.GlobalOperationsClient()
-        operation_client.wait(project=project_id, operation=operation.name)
-        print_success("已添加允许所有入站连接的规则。")
-    except Exception as e:
-        if "already exists" in str(e):
-            print_warning(f"规则 {rule_name} 已存在。")
-        else:
-            print(f"【失败】{e}")
-            traceback.print_exc()
+
+def cdn_deny_rule_name(index):
+    return f"{CDN_DENY_RULE_PREFIX}-{index}"
 
 
 def add_deny_cdn_egress(project_id, ip_ranges, network):
     if not ip_ranges:
         print("IP 列表为空，跳过创建拒绝规则。")
-        return
-
-    firewall_client = compute_v1.FirewallsClient()
-    rule_name = "deny-cdn-egress-custom"
-
-    print(f"\n正在创建出站拒绝规则: {rule_name} ...")
+        return True
 
-    firewall_rule = compute_v1.Firewall()
-    firewall_rule.name = rule_name
-    firewall_rule.direction = "EGRESS"
-    firewall_rule.network = network
-    firewall_rule.priority = 900
-    firewall_rule.destination_ranges = ip_ranges
+    shards = shard_cidrs(collapse_cidrs(ip_ranges))
+    specs = [
+        firewall_rule_spec(cdn_deny_rule_name(i), "EGRESS", 900, network, shard, "denied")
+        for i, shard in enumerate(shards, 1)
+    ]
+    print(f"\n正在同步 {len(specs)} 条出站拒绝规则 ({CDN_DENY_RULE_PREFIX}-1..{len(specs)}) ...")
+    # 多余的旧分片 (含旧版未编号规则) 在同一轮对账中删除。
+    if not reconcile_firewall(project_id, specs, [CDN_DENY_RULE_PREFIX]):
+        return False
+    print_success(f"拒绝规则已就绪，共 {len(specs)} 条，拦截 {sum(len(shard) for shard in shards)} 个 IP 段。")
+    return True
 
-    deny_config = compute_v1.Denied()
-    set_protocol_field(deny_config, "all")
-    firewall_rule.denied = [deny_config]
 
-    try:
-        operation = firewall_client.insert(project=project_id, firewall_resource=firewall_rule)
-        print("正在应用规则...")
-        operation_client = compute_v1.GlobalOperationsClient()
-        operation_client.wait(project=project_id, operation=operation.name)
-        print_success(f"已添加拒绝规则，共拦截 {len(ip_ranges)} 个 IP 段。")
-    except Exception as e:
-        if "already exists" in str(e):
-            print_warning(f"规则 {rule_name} 已存在。")
-        else:
-            print(f"【失败】{e}")
-            traceback.print_exc()
+def load_cdn_deny_ranges():
+    ips = read_cdn_ips()
+    if not ips:
+        return []
+    collapsed = collapse_cidrs(ips)
+    ranges = [str(net) for version in (4, 6) for net in collapsed[version]]
+    rule_count = len(shard_cidrs(collapsed))
+    print_info(
+        f"规整合并后剩余 {len(ranges)} 个网段 (IPv4 {len(collapsed[4])} / IPv6 {len(collapsed[6])})，"
+        f"需要 {rule_count} 条规则。"
+    )
+    return ranges
 
 
 def configure_firewall(project_id, network):
@@ -455,13 +2259,8 @@ def configure_firewall(project_id, network):
 
     choice_out = input("\n[2/2] 是否添加【拒绝对 cdnip.txt 中 IP 的出站连接】规则? (y/n): ").strip().lower()
     if choice_out == "y":
-        ips = read_cdn_ips()
+        ips = load_cdn_deny_ranges()
         if ips:
-            if len(ips) > 256:
-                print(f"【警告】IP 数量 ({len(ips)}) 超过 GCP 单条规则上限 (256)。")
-                print("脚本将只取前 256 个 IP。")
-                ips = ips[:256]
-
             add_deny_cdn_egress(project_id, ips, network)
     else:
         print("已跳过出站规则配置。")
@@ -474,87 +2273,155 @@ def is_not_found_error(exc):
     return "notfound" in msg or "not found" in msg or "404" in msg
 
 
-def delete_firewall_rule(project_id, rule_name):
-    firewall_client = compute_v1.FirewallsClient()
-    try:
-        operation = firewall_client.delete(project=project_id, firewall=rule_name)
-        operation_client = compute_v1.GlobalOperationsClient()
-        operation_client.wait(project=project_id, operation=operation.name)
-        print_success(f"已删除防火墙规则: {rule_name}")
-        return True
-    except Exception as e:
-        if is_not_found_error(e):
-            print_info(f"防火墙规则不存在，已跳过: {rule_name}")
-            return True
-        print_warning(f"删除防火墙规则失败: {rule_name} ({e})")
-        return False
-
-
 def delete_disks_if_needed(project_id, zone, disk_names):
     if not disk_names:
         return True
-    disk_client = compute_v1.DisksClient()
+    disk_client = get_client("DisksClient")
+
+    def delete(disk_name):
+        operation = disk_client.delete(project=project_id, zone=zone, disk=disk_name)
+        wait_for_operation(project_id, zone, operation.name)
+
     all_ok = True
-    for disk_name in disk_names:
-        try:
-            operation = disk_client.delete(project=project_id, zone=zone, disk=disk_name)
-            wait_for_operation(project_id, zone, operation.name)
-            print_success(f"已删除磁盘: {disk_name}")
-        except Exception as e:
-            if is_not_found_error(e):
+    with ThreadPoolExecutor(max_workers=len(disk_names)) as executor:
+        futures = {executor.submit(delete, disk_name): disk_name for disk_name in disk_names}
+        for future in as_completed(futures):
+            disk_name = futures[future]
+            error = future.exception()
+            if error is None:
+                print_success(f"已删除磁盘: {disk_name}")
+            elif is_not_found_error(error):
                 print_info(f"磁盘不存在，已跳过: {disk_name}")
             else:
-                print_warning(f"删除磁盘失败: {disk_name} ({e})")
+                print_warning(f"删除磁盘失败: {disk_name} ({error})")
                 all_ok = False
     return all_ok
 
 
-def delete_free_resources(project_id, instance_info):
+def delete_instance_for_teardown(project_id, instance_info):
+    # 删除前先记下挂载的磁盘，实例删除后再清理。
     instance_name = instance_info["name"]
     zone = instance_info["zone"]
-
-    print("\n------------------------------------------------")
-    print("即将删除以下资源（可以重新创建免费资源）：")
-    print(f"- 实例: {instance_name} ({zone})")
-    print(f"- 相关磁盘（如仍存在）")
-    print(f"- 防火墙规则: {', '.join(FIREWALL_RULES_TO_CLEAN)}")
-    confirm = input("请输入 DELETE 确认删除: ").strip()
-    if confirm != "DELETE":
-        print("已取消删除操作。")
-        return False
-
-    instance_client = compute_v1.InstancesClient()
+    instance_client = get_client("InstancesClient")
     disk_names = []
     try:
         inst = instance_client.get(project=project_id, zone=zone, instance=instance_name)
-        for disk in inst.disks:
-            if disk.source:
-                disk_names.append(disk.source.split("/")[-1])
+        disk_names = [disk.source.split("/")[-1] for disk in inst.disks if disk.source]
     except Exception as e:
+        if is_not_found_error(e):
+            forget_instance(project_id, zone, instance_name)
+            print_info(f"实例不存在，已跳过删除: {instance_name}")
+            return []
         print_warning(f"读取实例信息失败，磁盘清理可能不完整: {e}")
 
-    print_info("正在删除实例...")
     try:
         operation = instance_client.delete(project=project_id, zone=zone, instance=instance_name)
         wait_for_operation(project_id, zone, operation.name)
-        print_success("实例已删除。")
     except Exception as e:
-        if is_not_found_error(e):
-            print_info("实例不存在，已跳过删除。")
-        else:
-            print_warning(f"实例删除失败: {e}")
-            return False
+        if not is_not_found_error(e):
+            raise RuntimeError(f"实例删除失败: {describe_api_error(e)}")
+    forget_instance(project_id, zone, instance_name)
+    print_success(f"实例已删除: {instance_name}")
+    return disk_names
+
+
+def teardown_step_key(targets, project_id, instance_info):
+    # 同名实例可能分布在不同可用区 (如默认的 free-tier-vm)，键里必须带上可用区。
+    if len({target_project for target_project, _ in targets}) > 1:
+        return f"{instance_label(instance_info)}@{project_id}"
+    return instance_label(instance_info)
+
+
+def build_teardown_plan(targets):
+    # targets: [(project_id, instance_info)]
+    # 防火墙规则与实例无关，和实例删除同时进行；磁盘要等实例删除后才能删。
+    projects = list(dict.fromkeys(project_id for project_id, _ in targets))
+    steps = []
+    for project_id in projects:
+        steps.append(
+            {
+                "name": f"firewall@{project_id}" if len(projects) > 1 else "firewall",
+                "deps": [],
+                "fn": lambda results, project_id=project_id: require_step(
+                    reconcile_firewall(project_id, [], FIREWALL_RULES_TO_CLEAN), "防火墙规则清理失败"
+                ),
+            }
+        )
+    for project_id, instance_info in targets:
+        key = teardown_step_key(targets, project_id, instance_info)
+        steps.append(
+            {
+                "name": f"delete:{key}",
+                "deps": [],
+                "instance_info": instance_info,
+                "fn": lambda results, project_id=project_id, instance_info=instance_info: delete_instance_for_teardown(
+                    project_id, instance_info
+                ),
+            }
+        )
+        steps.append(
+            {
+                "name": f"disks:{key}",
+                "deps": [f"delete:{key}"],
+                "fn": lambda results, project_id=project_id, zone=instance_info["zone"], key=key: require_step(
+                    delete_disks_if_needed(project_id, zone, results[f"delete:{key}"]), "磁盘删除失败"
+                ),
+            }
+        )
+    return steps
 
-    delete_disks_if_needed(project_id, zone, disk_names)
 
-    print_info("正在清理防火墙规则...")
-    for rule_name in FIREWALL_RULES_TO_CLEAN:
-        delete_firewall_rule(project_id, rule_name)
+def teardown_free_resources(targets, max_workers=16):
+    # 返回已成功删除的实例；磁盘或防火墙清理失败只告警，不影响实例已删除的事实。
+    steps = build_teardown_plan(targets)
+    _, records = run_plan(steps, max_workers=min(max_workers, len(steps)))
+    failed = [name for name, record in records.items() if record["status"] != "ok"]
+    if failed:
+        print_warning(f"以下步骤未完成: {', '.join(failed)}")
+    else:
+        print_success("清理完成。建议到控制台确认无残留资源。")
+    return [
+        step["instance_info"]
+        for step in steps
+        if "instance_info" in step and records[step["name"]]["status"] == "ok"
+    ]
+
 
-    print_success("清理完成。建议到控制台确认无残留资源。")
+def confirm_teardown(targets):
+    print("\n------------------------------------------------")
+    print("即将删除以下资源（可以重新创建免费资源）：")
+    for project_id, instance_info in targets:
+        print(f"- 实例: {instance_info['name']} ({instance_info['zone']}, 项目 {project_id})")
+    print(f"- 相关磁盘（如仍存在）")
+    print(f"- 防火墙规则: {', '.join(FIREWALL_RULES_TO_CLEAN)} (含分片 -N)")
+    confirm = input("请输入 DELETE 确认删除: ").strip()
+    if confirm != "DELETE":
+        print("已取消删除操作。")
+        return False
     return True
 
 
+def delete_free_resources(project_id, instance_info):
+    targets = [(project_id, instance_info)]
+    if not confirm_teardown(targets):
+        return False
+    return bool(teardown_free_resources(targets))
+
+
+def delete_free_resources_menu(project_id):
+    instance_infos = select_instances(project_id)
+    if not instance_infos:
+        return []
+    targets = [(project_id, instance_info) for instance_info in instance_infos]
+    if not confirm_teardown(targets):
+        return []
+    return [instance_label(instance_info) for instance_info in teardown_free_resources(targets)]
+
+
+def supports_ssh_multiplexing():
+    return os.name == "posix" and shutil.which("ssh") is not None
+
+
 def pick_remote_method():
     has_gcloud = shutil.which("gcloud") is not None
     has_ssh = shutil.which("ssh") is not None
@@ -566,7 +2433,7 @@ def pick_remote_method():
     if has_gcloud:
         choice = input("是否使用 gcloud compute ssh 远程执行? (Y/n): ").strip().lower()
         if choice in ("", "y", "yes"):
-            return {"method": "gcloud"}
+            return {"method": "gcloud", "multiplex": supports_ssh_multiplexing()}
 
     if not has_ssh:
         print_warning("未找到 ssh 命令，无法继续。")
@@ -576,7 +2443,138 @@ def pick_remote_method():
     ssh_user = input(f"请输入 SSH 用户名 (默认 {default_user}): ").strip() or default_user
     ssh_port = input("请输入 SSH 端口 (默认 22): ").strip() or "22"
     ssh_key = input("请输入 SSH 私钥路径 (留空表示使用默认密钥): ").strip()
-    return {"method": "ssh", "user": ssh_user, "port": ssh_port, "key": ssh_key}
+    return {
+        "method": "ssh",
+        "user": ssh_user,
+        "port": ssh_port,
+        "key": ssh_key,
+        "multiplex": supports_ssh_multiplexing(),
+    }
+
+
+_SSH_CONTROL_SOCKETS = {}
+_REMOTE_STEP_TIMINGS = []
+_SSH_LOCK = threading.Lock()
+_SSH_CONTROL_DIR_RESOLVED = {}
+
+
+def private_dir_ok(path):
+    # 必须是自己拥有、权限 0700 的真实目录 (不是符号链接)。
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+        return False
+    if stat.S_IMODE(st.st_mode) != 0o700:
+        os.chmod(path, 0o700)
+    return True
+
+
+def ssh_control_dir():
+    # /tmp 下的目录名可预测，可能被其他用户抢先创建来劫持 ControlMaster 套接字；
+    # 校验不通过时退回 ~/.ssh 下的目录，都不可用则不复用连接。
+    with _SSH_LOCK:
+        if "path" not in _SSH_CONTROL_DIR_RESOLVED:
+            resolved = None
+            candidates = (SSH_CONTROL_DIR, SSH_CONTROL_FALLBACK_DIR) if hasattr(os, "getuid") else ()
+            for path in candidates:
+                try:
+                    os.makedirs(path, mode=0o700, exist_ok=True)
+                    if private_dir_ok(path):
+                        resolved = path
+                        break
+                except OSError:
+                    continue
+                print_warning(f"SSH 复用目录 {path} 不属于当前用户或权限不安全，已跳过。")
+            _SSH_CONTROL_DIR_RESOLVED["path"] = resolved
+        return _SSH_CONTROL_DIR_RESOLVED["path"]
+
+
+def ssh_control_path(project_id, instance_info, remote_config):
+    # 套接字路径有长度限制 (约 104 字节)，用短哈希命名。
+    key = "/".join(
+        [
+            remote_config.get("method", ""),
+            remote_config.get("user", ""),
+            project_id,
+            instance_info["zone"],
+            instance_info["name"],
+        ]
+    )
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+    control_dir = ssh_control_dir()
+    return os.path.join(control_dir, f"{digest}.sock") if control_dir else ""
+
+
+def ssh_control_options(project_id, instance_info, remote_config):
+    # 同一实例的所有 ssh/scp 复用一条主连接 (ControlMaster)，只握手一次。
+    if not remote_config.get("multiplex"):
+        return []
+    path = ssh_control_path(project_id, instance_info, remote_config)
+    if not path:
+        return []
+    with _SSH_LOCK:
+        _SSH_CONTROL_SOCKETS[path] = instance_label(instance_info)
+    return [
+        "-oControlMaster=auto",
+        f"-oControlPath={path}",
+        f"-oControlPersist={SSH_CONTROL_PERSIST}",
+    ]
+
+
+def run_remote_step(step, project_id, instance_info, remote_config, cmd, **kwargs):
+    reused = bool(remote_config.get("multiplex")) and os.path.exists(
+        ssh_control_path(project_id, instance_info, remote_config)
+    )
+    started = time.monotonic()
+    try:
+        with trace_span("subprocess", f"{cmd[0]} {step}", instance=instance_label(instance_info), reused=reused):
+            return subprocess.run(cmd, **kwargs)
+    finally:
+        with _SSH_LOCK:
+            _REMOTE_STEP_TIMINGS.append(
+                {
+                    "instance": instance_label(instance_info),
+                    "step": step,
+                    "reused": reused,
+                    "seconds": time.monotonic() - started,
+                }
+            )
+
+
+def print_remote_timings():
+    with _SSH_LOCK:
+        timings = list(_REMOTE_STEP_TIMINGS)
+    if not timings:
+        return
+    print("\n--- 远程步骤耗时 ---")
+    for item in timings:
+        conn = "复用连接" if item["reused"] else "新建连接"
+        print(f"{item['instance']:<36} {item['step']:<28} {conn} {item['seconds']:>7.1f}s")
+    fresh = [item["seconds"] for item in timings if not item["reused"]]
+    reused = [item["seconds"] for item in timings if item["reused"]]
+    if fresh and reused:
+        print(
+            f"新建连接平均 {sum(fresh) / len(fresh):.1f}s ({len(fresh)} 次) | "
+            f"复用连接平均 {sum(reused) / len(reused):.1f}s ({len(reused)} 次)"
+        )
+
+
+def close_ssh_sessions():
+    with _SSH_LOCK:
+        sockets = dict(_SSH_CONTROL_SOCKETS)
+        _SSH_CONTROL_SOCKETS.clear()
+    for path, label in sockets.items():
+        if not os.path.exists(path):
+            continue
+        try:
+            subprocess.run(
+                ["ssh", f"-oControlPath={path}", "-O", "exit", "gcp-free-master"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=10,
+            )
+            print_info(f"已关闭 SSH 主连接: {label}")
+        except Exception:
+            pass
 
 
 def build_remote_download_command(script_url):
@@ -592,11 +2590,16 @@ def build_remote_download_command(script_url):
     )
 
 
-def build_remote_exec_command(project_id, instance_info, remote_config, remote_command):
+def build_remote_exec_command(project_id, instance_info, remote_config, remote_command, batch=False):
     instance_name = instance_info["name"]
     zone = instance_info["zone"]
     method = remote_config.get("method")
 
+    control_options = ssh_control_options(project_id, instance_info, remote_config)
+    if batch:
+        # 并发执行时无法交互应答，禁止一切提示。
+        control_options = control_options + ["-oBatchMode=yes", "-oStrictHostKeyChecking=accept-new"]
+
     if method == "gcloud":
         return [
             "gcloud",
@@ -607,6 +2610,8 @@ def build_remote_exec_command(project_id, instance_info, remote_config, remote_c
             project_id,
             "--zone",
             zone,
+            *[f"--ssh-flag={opt}" for opt in control_options],
+            *(["--quiet"] if batch else []),
             "--command",
             remote_command,
         ]
@@ -615,7 +2620,7 @@ def build_remote_exec_command(project_id, instance_info, remote_config, remote_c
         if not host or host == "-":
             print_warning("该实例没有外网 IP，无法使用 SSH 直连。")
             return None
-        cmd = ["ssh"]
+        cmd = ["ssh", *control_options]
         port = remote_config.get("port")
         if port:
             cmd += ["-p", str(port)]
@@ -629,68 +2634,234 @@ def build_remote_exec_command(project_id, instance_info, remote_config, remote_c
     return None
 
 
-def build_remote_upload_command(project_id, instance_info, remote_config, local_path, remote_path):
-    instance_name = instance_info["name"]
-    zone = instance_info["zone"]
-    method = remote_config.get("method")
+def load_local_script(script_key):
+    script_url = REMOTE_SCRIPT_URLS.get(script_key)
+    if not script_url:
+        return None
+    path = os.path.join(LOCAL_SCRIPTS_DIR, script_url.rsplit("/", 1)[-1])
+    try:
+        with open(path, "rb") as f:
+            content = f.read()
+    except OSError:
+        return None
+    return {
+        "name": os.path.basename(path),
+        "content": content,
+        "sha256": hashlib.sha256(content).hexdigest(),
+    }
+
+
+def build_remote_cached_script_command(script, upload):
+    # 远端按内容哈希缓存脚本：命中则直接执行；未命中时返回特殊退出码，
+    # 由本地改为通过 stdin 传输脚本后再执行。
+    cached = f"{REMOTE_CACHE_DIR}/{script['sha256'][:16]}-{script['name']}"
+    check = f"[ \"$(sha256sum \"$f\" 2>/dev/null | cut -d' ' -f1)\" = \"{script['sha256']}\" ]"
+    if upload:
+        fetch = (
+            f"rm -f {REMOTE_CACHE_DIR}/*-{script['name']};"
+            "cat > \"$f.tmp\";"
+            "mv \"$f.tmp\" \"$f\";"
+            f"if ! {check}; then echo \"error: script checksum mismatch\"; rm -f \"$f\"; exit 1; fi;"
+        )
+    else:
+        fetch = f"if ! {check}; then exit {REMOTE_CACHE_MISS_EXIT}; fi;"
+    return (
+        "set -e;"
+        f"mkdir -p {REMOTE_CACHE_DIR};"
+        f"f=\"{cached}\";"
+        f"{fetch}"
+        "sudo bash \"$f\""
+    )
 
-    if method == "gcloud":
-        return [
-            "gcloud",
-            "compute",
-            "scp",
-            local_path,
-            f"{instance_name}:{remote_path}",
-            "--project",
-            project_id,
-            "--zone",
-            zone,
-        ]
-    if method == "ssh":
-        if shutil.which("scp") is None:
-            print_warning("未找到 scp 命令，无法上传文件。")
-            return None
-        host = instance_info.get("external_ip")
-        if not host or host == "-":
-            print_warning("该实例没有外网 IP，无法使用 SSH 直连。")
-            return None
-        cmd = ["scp"]
-        port = remote_config.get("port")
-        if port:
-            cmd += ["-P", str(port)]
-        key_path = remote_config.get("key")
-        if key_path:
-            cmd += ["-i", key_path]
-        cmd += [local_path, f"{remote_config.get('user')}@{host}:{remote_path}"]
-        return cmd
 
-    print_warning("远程执行方式未设置。")
-    return None
+def script_job(script_key):
+    script_url = REMOTE_SCRIPT_URLS[script_key]
+    script = load_local_script(script_key)
+    if script is None:
+        return {
+            "label": script_url,
+            "command": build_remote_download_command(script_url),
+            "upload_command": None,
+            "content": None,
+        }
+    return {
+        "label": f"{script['name']} (sha256 {script['sha256'][:12]})",
+        "command": build_remote_cached_script_command(script, upload=False),
+        "upload_command": build_remote_cached_script_command(script, upload=True),
+        "content": script["content"],
+    }
+
+
+def command_job(remote_command):
+    return {"label": remote_command, "command": remote_command, "upload_command": None, "content": None}
+
+
+def run_remote_job(project_id, instance_info, remote_config, job):
+    # 先执行 command；若返回缓存未命中退出码，再通过 stdin 传输内容执行 upload_command。
+    cmd = build_remote_exec_command(project_id, instance_info, remote_config, job["command"])
+    if not cmd:
+        return None
+    result = run_remote_step(job["label"], project_id, instance_info, remote_config, cmd)
+    if job["upload_command"] and result.returncode == REMOTE_CACHE_MISS_EXIT:
+        print_info(f"远端内容未命中，正在通过 SSH 传输 ({len(job['content'])} 字节)...")
+        job["uploaded"] = True
+        cmd = build_remote_exec_command(project_id, instance_info, remote_config, job["upload_command"])
+        result = run_remote_step(
+            f"{job['label']} (传输)", project_id, instance_info, remote_config, cmd, input=job["content"]
+        )
+    return result.returncode
 
 
 def run_remote_script(project_id, instance_info, script_key, remote_config):
-    script_url = REMOTE_SCRIPT_URLS.get(script_key)
-    if not script_url:
+    if script_key not in REMOTE_SCRIPT_URLS:
         print_warning("未知的脚本类型，无法执行。")
         return False
-    remote_command = build_remote_download_command(script_url)
-    cmd = build_remote_exec_command(project_id, instance_info, remote_config, remote_command)
-    if not cmd:
-        return False
 
-    print_info(f"正在远程执行脚本: {script_url}")
+    job = script_job(script_key)
+    if job["content"] is None:
+        print_warning("本地未找到脚本，改为让远端从 GitHub 下载。")
+    print_info(f"正在远程执行脚本: {job['label']}")
     try:
-        result = subprocess.run(cmd)
-        if result.returncode == 0:
+        returncode = run_remote_job(project_id, instance_info, remote_config, job)
+        if returncode is None:
+            return False
+        if returncode == 0:
             print_success("远程脚本执行完成。")
             return True
-        print_warning(f"远程脚本执行失败，退出码: {result.returncode}")
+        print_warning(f"远程脚本执行失败，退出码: {returncode}")
         return False
     except Exception as e:
         print_warning(f"远程执行失败: {e}")
         return False
 
 
+def stream_prefixed(pipe, prefix, color="", on_line=None):
+    reset = "\033[0m" if color else ""
+    for raw in iter(pipe.readline, b""):
+        line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+        if on_line is not None and on_line(line):
+            continue
+        print_line(f"{color}{prefix}{reset} {line}")
+    pipe.close()
+
+
+def run_streamed(cmd, prefix, input_bytes=None, on_line=None):
+    with trace_span("subprocess", f"{cmd[0]} {prefix}", upload=input_bytes is not None):
+        return run_streamed_untraced(cmd, prefix, input_bytes, on_line)
+
+
+def run_streamed_untraced(cmd, prefix, input_bytes=None, on_line=None):
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if input_bytes is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    readers = [
+        threading.Thread(target=stream_prefixed, args=(proc.stdout, prefix, "", on_line), daemon=True),
+        threading.Thread(target=stream_prefixed, args=(proc.stderr, prefix, "\033[93m"), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+    if input_bytes is not None:
+        try:
+            proc.stdin.write(input_bytes)
+        except BrokenPipeError:
+            pass
+        finally:
+            proc.stdin.close()
+    returncode = proc.wait()
+    for reader in readers:
+        reader.join()
+    return returncode
+
+
+def fanout_worker(project_id, instance_info, remote_config, job):
+    project_id = instance_info.get("project", project_id)
+    prefix = f"[{instance_info['name']}]"
+    started = time.monotonic()
+    result = {"instance": instance_label(instance_info), "returncode": None, "error": None}
+    try:
+        cmd = build_remote_exec_command(project_id, instance_info, remote_config, job["command"], batch=True)
+        if not cmd:
+            result["error"] = "无法构建远程命令"
+        else:
+            returncode = run_streamed(cmd, prefix)
+            if job["upload_command"] and returncode == REMOTE_CACHE_MISS_EXIT:
+                print_line(f"{prefix} 远端内容未命中，正在传输 {len(job['content'])} 字节...")
+                cmd = build_remote_exec_command(
+                    project_id, instance_info, remote_config, job["upload_command"], batch=True
+                )
+                returncode = run_streamed(cmd, prefix, input_bytes=job["content"])
+            result["returncode"] = returncode
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.monotonic() - started
+    return result
+
+
+def run_remote_fanout(project_id, instance_infos, remote_config, job, max_parallel=5):
+    # 对多台实例并发执行同一任务，输出按主机名前缀实时打印。
+    print_info(f"正在对 {len(instance_infos)} 台实例并发执行 (并发上限 {max_parallel}): {job['label']}")
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        results = list(
+            executor.map(
+                lambda inst: fanout_worker(project_id, inst, remote_config, job),
+                instance_infos,
+            )
+        )
+
+    print("\n--- 批量远程执行结果 ---")
+    print(f"{'实例':<36} {'退出码':>6} {'耗时':>8}  备注")
+    for res in results:
+        code = "-" if res["returncode"] is None else str(res["returncode"])
+        note = res["error"] or ("成功" if res["returncode"] == 0 else "失败")
+        print(f"{res['instance']:<36} {code:>6} {res['seconds']:>7.1f}s  {note}")
+    ok = sum(1 for res in results if res["returncode"] == 0)
+    print_info(f"成功 {ok}/{len(results)}，总耗时 {time.monotonic() - started:.1f}s。")
+    return results
+
+
+def select_fanout_action():
+    print("\n--- 请选择要批量执行的内容 ---")
+    print("[1] Debian换源 (apt.sh)")
+    print("[2] 安装 dae (dae.sh)")
+    print("[3] 超额关闭 ssh 之外其他入站 (net_iptables.sh)")
+    print("[4] 超额自动关机 (net_shutdown.sh)")
+    print("[5] 推送 config.dae（未变化则跳过，优先热重载）")
+    print("[6] 自定义命令")
+    print("[0] 返回")
+    scripts = {"1": "apt", "2": "dae", "3": "net_iptables", "4": "net_shutdown"}
+    while True:
+        choice = input("请输入数字选择: ").strip()
+        if choice in scripts:
+            return script_job(scripts[choice])
+        if choice == "5":
+            job = dae_config_job()
+            if job:
+                return job
+        if choice == "6":
+            command = input("请输入要执行的命令: ").strip()
+            if command:
+                return command_job(command)
+        if choice == "0":
+            return None
+        print("输入无效，请重试。")
+
+
+def remote_fanout_menu(project_id, remote_config):
+    instance_infos = select_instances(project_id)
+    if not instance_infos:
+        return []
+    job = select_fanout_action()
+    if not job:
+        return []
+    max_parallel = prompt_positive_int("请输入并发上限", min(len(instance_infos), 5))
+    return run_remote_fanout(project_id, instance_infos, remote_config, job, max_parallel=max_parallel)
+
+
 def select_traffic_monitor_script():
     print("\n--- 请选择流量监控脚本 ---")
     print("[1] 安装 超额关闭 ssh 之外其他入站 (net_iptables.sh)")
@@ -707,62 +2878,488 @@ def select_traffic_monitor_script():
         print("输入无效，请重试。")
 
 
-def deploy_dae_config(project_id, instance_info, remote_config):
-    local_config = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.dae")
-    if not os.path.isfile(local_config):
+def build_dae_apply_command(source_path):
+    # 先校验再替换；dae 正在运行时热重载，不中断现有连接，否则启动服务。
+    # 该命令也会被嵌入单引号包裹的 bash -c 中，不能包含单引号。
+    # dae 拒绝加载组/其他用户有权限的配置文件，校验前先收紧权限。
+    return (
+        "set -e;"
+        f"sudo chmod 600 {source_path};"
+        f"if command -v dae >/dev/null 2>&1 && ! sudo dae validate -c {source_path}; then "
+        "echo \"error: config.dae 校验失败，未应用\"; exit 1; fi;"
+        "sudo mkdir -p /usr/local/etc/dae;"
+        f"sudo install -m 600 {source_path} {DAE_CONFIG_PATH};"
+        "if sudo systemctl is-active --quiet dae; then "
+        "sudo systemctl reload dae 2>/dev/null || sudo dae reload || sudo systemctl restart dae;"
+        "echo \"dae 已重新加载配置\";"
+        "else sudo systemctl enable --now dae; echo \"dae 已启动\"; fi"
+    )
+
+
+def build_dae_deploy_command(digest, upload):
+    # 比较远端配置哈希：一致则跳过；否则返回缓存未命中退出码，由本地通过 stdin 传输新配置。
+    check = f"[ \"$(sudo sha256sum {DAE_CONFIG_PATH} 2>/dev/null | cut -d' ' -f1)\" = \"{digest}\" ]"
+    if not upload:
+        return f"if {check}; then echo \"config.dae 未变化，跳过部署\"; exit 0; fi; exit {REMOTE_CACHE_MISS_EXIT}"
+    return (
+        "set -e;"
+        # dae 只接受 .dae 后缀的配置文件。
+        "tmp=$(mktemp --suffix=.dae /tmp/gcp_free_config.XXXXXX);"
+        "trap 'rm -f \"$tmp\"' EXIT;"
+        "cat > \"$tmp\";"
+        f"if [ \"$(sha256sum \"$tmp\" | cut -d' ' -f1)\" != \"{digest}\" ]; then "
+        "echo \"error: config.dae 传输校验失败\"; exit 1; fi;"
+        + build_dae_apply_command('"$tmp"')
+    )
+
+
+def dae_config_job():
+    local_config = os.path.join(SCRIPT_DIR, "config.dae")
+    try:
+        with open(local_config, "rb") as f:
+            content = f.read()
+    except OSError:
         print_warning(f"找不到本地配置文件: {local_config}")
+        return None
+    digest = hashlib.sha256(content).hexdigest()
+    return {
+        "label": f"config.dae (sha256 {digest[:12]})",
+        "command": build_dae_deploy_command(digest, upload=False),
+        "upload_command": build_dae_deploy_command(digest, upload=True),
+        "content": content,
+    }
+
+
+PROVISION_STAGE_MARKER = "__GCP_FREE_STAGE__"
+PROVISION_PACKAGES = {
+    "dae": ["curl", "unzip"],
+    "net_iptables": ["vnstat", "bc"],
+    "net_shutdown": ["vnstat", "bc"],
+}
+
+# 远端 PATH 中的 apt / apt-get 包装：软件源未变化时跳过重复的 update，
+# 要安装的包都已存在时跳过 install。
+PROVISION_APT_WRAPPER = r"""#!/bin/bash
+real="/usr/bin/$(basename "$0")"
+stamp="$GCP_FREE_WORK/apt-update.stamp"
+action=""
+for arg in "$@"; do
+    case "$arg" in -*) ;; *) action="$arg"; break ;; esac
+done
+if [ "$action" = "update" ]; then
+    sum=$(cat /etc/apt/sources.list /etc/apt/sources.list.d/* 2>/dev/null | sha256sum | cut -d' ' -f1)
+    if [ -f "$stamp" ] && [ "$(cat "$stamp")" = "$sum" ]; then
+        echo "[provision] 软件源未变化，跳过重复的 $(basename "$0") update"
+        exit 0
+    fi
+    "$real" "$@" || exit $?
+    echo "$sum" > "$stamp"
+    exit 0
+fi
+if [ "$action" = "install" ]; then
+    missing=0
+    found=0
+    past_action=0
+    for arg in "$@"; do
+        if [ "$past_action" = 0 ]; then
+            [ "$arg" = "install" ] && past_action=1
+            continue
+        fi
+        case "$arg" in -*) continue ;; esac
+        found=1
+        dpkg -s "$arg" >/dev/null 2>&1 || missing=1
+    done
+    if [ "$found" = 1 ] && [ "$missing" = 0 ]; then
+        echo "[provision] 软件包均已安装，跳过: $*"
+        exit 0
+    fi
+fi
+exec "$real" "$@"
+"""
+
+
+def build_provision_bundle(stages):
+    # stages: [(阶段名, 阶段命令, {文件名: 内容 bytes})]，全部打包为一个 bash 脚本，
+    # 通过一次 SSH 会话的 stdin 交给远端 root 执行。
+    lines = [
+        "set -u",
+        'export GCP_FREE_WORK="$(mktemp -d /tmp/gcp_free_provision.XXXXXX)"',
+        "trap 'rm -rf \"$GCP_FREE_WORK\"' EXIT",
+        'mkdir -p "$GCP_FREE_WORK/bin"',
+        "cat > \"$GCP_FREE_WORK/bin/apt-get\" <<'GCP_FREE_WRAPPER'",
+        PROVISION_APT_WRAPPER.rstrip("\n"),
+        "GCP_FREE_WRAPPER",
+        'cp "$GCP_FREE_WORK/bin/apt-get" "$GCP_FREE_WORK/bin/apt"',
+        'chmod +x "$GCP_FREE_WORK/bin/apt-get" "$GCP_FREE_WORK/bin/apt"',
+        'export PATH="$GCP_FREE_WORK/bin:$PATH"',
+        "export DEBIAN_FRONTEND=noninteractive",
+        "run_stage() {",
+        '    local name="$1"',
+        "    shift",
+        "    local start end rc",
+        "    start=$(date +%s%N)",
+        '    echo "==== [$name] ===="',
+        # 整个脚本经 stdin 传给 bash -s，阶段命令不能读 stdin，否则会吃掉后面的脚本。
+        '    if "$@" </dev/null; then rc=0; else rc=$?; fi',
+        "    end=$(date +%s%N)",
+        f'    echo "{PROVISION_STAGE_MARKER} $name $rc $(( (end - start) / 1000000 ))"',
+        "    return $rc",
+        "}",
+    ]
+    for _, _, files in stages:
+        for filename, content in files.items():
+            lines.append(f"base64 -d > \"$GCP_FREE_WORK/{filename}\" <<'GCP_FREE_B64'")
+            lines.append(base64.encodebytes(content).decode("ascii").rstrip("\n"))
+            lines.append("GCP_FREE_B64")
+    for name, command, _ in stages:
+        lines.append(f"run_stage {name} {command} || exit $?")
+    return "\n".join(lines) + "\n"
+
+
+def plan_provision_stages(with_apt=True, with_dae=True, with_config=True, monitor_key=None):
+    stages = []
+    script_keys = (["apt"] if with_apt else []) + (["dae"] if with_dae else [])
+
+    packages = []
+    for key in (["dae"] if with_dae else []) + ([monitor_key] if monitor_key else []):
+        for pkg in PROVISION_PACKAGES.get(key, []):
+            if pkg not in packages:
+                packages.append(pkg)
+
+    for key in script_keys:
+        script = load_local_script(key)
+        if script is None:
+            raise FileNotFoundError(f"本地缺少脚本: {REMOTE_SCRIPT_URLS[key]}")
+        stages.append((key, f"bash \"$GCP_FREE_WORK/{script['name']}\"", {script["name"]: script["content"]}))
+        if key == "apt" and packages:
+            stages.append(("packages", f"apt-get install -y {' '.join(packages)}", {}))
+    if packages and not with_apt:
+        stages.insert(0, ("packages", f"bash -c 'apt-get update -y && apt-get install -y {' '.join(packages)}'", {}))
+
+    if with_config:
+        with open(os.path.join(SCRIPT_DIR, "config.dae"), "rb") as f:
+            config = f.read()
+        apply_command = build_dae_apply_command('\"$GCP_FREE_WORK/config.dae\"')
+        stages.append(("config", f"bash -c '{apply_command}'", {"config.dae": config}))
+
+    if monitor_key:
+        script = load_local_script(monitor_key)
+        if script is None:
+            raise FileNotFoundError(f"本地缺少脚本: {REMOTE_SCRIPT_URLS[monitor_key]}")
+        stages.append((monitor_key, f"bash \"$GCP_FREE_WORK/{script['name']}\"", {script["name"]: script["content"]}))
+    return stages
+
+
+def wait_for_ssh_ready(project_id, instance_info, remote_config, timeout=180):
+    # 新建或刚重启的实例 sshd 尚未就绪，先轮询一个空命令。
+    deadline = time.monotonic() + timeout
+    delay = 3
+    while True:
+        cmd = build_remote_exec_command(project_id, instance_info, remote_config, "true", batch=True)
+        if not cmd:
+            return False
+        with trace_span("subprocess", f"{cmd[0]} ssh-ready", instance=instance_label(instance_info)):
+            result = subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if result.returncode == 0:
+            return True
+        if time.monotonic() + delay > deadline:
+            print_warning(f"等待 SSH 就绪超时: {instance_label(instance_info)}")
+            return False
+        time.sleep(delay)
+        delay = min(15, delay * 2)
+
+
+def run_provision_pipeline(project_id, instance_info, remote_config, **stage_options):
+    try:
+        stages = plan_provision_stages(**stage_options)
+    except OSError as e:
+        print_warning(f"无法组装部署流程: {e}")
+        return False
+    if not stages:
+        print_warning("未选择任何部署步骤。")
         return False
 
-    remote_tmp = "/tmp/config.dae"
-    upload_cmd = build_remote_upload_command(
-        project_id,
-        instance_info,
-        remote_config,
-        local_config,
-        remote_tmp,
-    )
-    if not upload_cmd:
+    bundle = build_provision_bundle(stages).encode("utf-8")
+    cmd = build_remote_exec_command(project_id, instance_info, remote_config, "sudo bash -s", batch=True)
+    if not cmd:
         return False
 
-    print_info("正在上传 config.dae ...")
+    timings = []
+
+    def on_line(line):
+        if line.startswith(PROVISION_STAGE_MARKER):
+            parts = line.split()
+            if len(parts) == 4:
+                timings.append((parts[1], int(parts[2]), int(parts[3]) / 1000))
+            return True
+        return False
+
+    print_info(f"正在一次性执行部署流程: {' -> '.join(name for name, _, _ in stages)}")
+    started = time.monotonic()
+    reused = bool(remote_config.get("multiplex")) and os.path.exists(
+        ssh_control_path(project_id, instance_info, remote_config)
+    )
     try:
-        result = subprocess.run(upload_cmd)
-        if result.returncode != 0:
-            print_warning(f"上传失败，退出码: {result.returncode}")
-            return False
+        returncode = run_streamed(cmd, f"[{instance_info['name']}]", input_bytes=bundle, on_line=on_line)
     except Exception as e:
-        print_warning(f"上传失败: {e}")
+        print_warning(f"远程执行失败: {e}")
         return False
+    elapsed = time.monotonic() - started
+    with _SSH_LOCK:
+        _REMOTE_STEP_TIMINGS.append(
+            {"instance": instance_label(instance_info), "step": "完整部署", "reused": reused, "seconds": elapsed}
+        )
 
-    remote_command = (
-        "set -e;"
-        "sudo mkdir -p /usr/local/etc/dae;"
-        "sudo cp /tmp/config.dae /usr/local/etc/dae/config.dae;"
-        "sudo chmod 600 /usr/local/etc/dae/config.dae;"
-        "sudo systemctl enable dae;"
-        "sudo systemctl restart dae;"
-        "rm -f /tmp/config.dae"
+    print("\n--- 部署阶段耗时 ---")
+    for name, rc, seconds in timings:
+        status = "成功" if rc == 0 else f"失败 (退出码 {rc})"
+        print(f"{name:<16} {seconds:>7.1f}s  {status}")
+    print(f"{'合计':<14} {elapsed:>7.1f}s  (含连接建立)")
+    if returncode == 0:
+        print_success("完整部署完成。")
+        return True
+    print_warning(f"完整部署失败，退出码: {returncode}")
+    return False
+
+
+def provision_menu(project_id, instance_info, remote_config):
+    print("\n--- 一键完整部署 ---")
+    with_apt = input("是否执行 Debian 换源 (仅适配 Debian 12)? (Y/n): ").strip().lower() in ("", "y", "yes")
+    with_config = input("是否上传 config.dae 并启用 dae? (Y/n): ").strip().lower() in ("", "y", "yes")
+    print("流量监控脚本: [1] net_iptables.sh  [2] net_shutdown.sh  [0] 不安装")
+    monitor_key = {"1": "net_iptables", "2": "net_shutdown"}.get(input("请输入数字选择: ").strip())
+    return run_provision_pipeline(
+        project_id,
+        instance_info,
+        remote_config,
+        with_apt=with_apt,
+        with_config=with_config,
+        monitor_key=monitor_key,
     )
-    exec_cmd = build_remote_exec_command(project_id, instance_info, remote_config, remote_command)
-    if not exec_cmd:
+
+
+def deploy_dae_config(project_id, instance_info, remote_config):
+    job = dae_config_job()
+    if not job:
         return False
 
-    print_info("正在应用配置并重启 dae ...")
+    print_info(f"正在部署 {job['label']} ...")
     try:
-        result = subprocess.run(exec_cmd)
-        if result.returncode == 0:
-            print_success("配置已更新并重启 dae。")
+        returncode = run_remote_job(project_id, instance_info, remote_config, job)
+        if returncode is None:
+            return False
+        if returncode == 0:
+            print_success("config.dae 已更新并应用。" if job.get("uploaded") else "config.dae 已是最新。")
             return True
-        print_warning(f"配置应用失败，退出码: {result.returncode}")
+        print_warning(f"配置应用失败，退出码: {returncode}")
         return False
     except Exception as e:
         print_warning(f"配置应用失败: {e}")
         return False
 
 
+def run_plan(steps, max_workers=4):
+    # steps: [{"name", "deps", "fn"}]，fn 接收已完成步骤的结果字典。
+    # 依赖全部成功的步骤立即并发执行；依赖失败的步骤跳过。
+    names = [step["name"] for step in steps]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"步骤名重复: {', '.join(duplicates)}")
+    names = set(names)
+    for step in steps:
+        unknown = [dep for dep in step.get("deps", []) if dep not in names]
+        if unknown:
+            raise ValueError(f"步骤 {step['name']} 依赖未知步骤: {', '.join(unknown)}")
+
+    pending = {step["name"]: step for step in steps}
+    records = {}
+    results = {}
+    running = {}
+    started = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            changed = True
+            while changed:
+                changed = False
+                for name, step in list(pending.items()):
+                    statuses = [records.get(dep, {}).get("status") for dep in step.get("deps", [])]
+                    if any(status in ("failed", "skipped") for status in statuses):
+                        records[name] = {"status": "skipped", "start": None, "end": None, "error": "依赖步骤未成功"}
+                        del pending[name]
+                        changed = True
+                    elif all(status == "ok" for status in statuses):
+                        records[name] = {"status": "running", "start": time.monotonic() - started}
+                        running[executor.submit(step["fn"], results)] = name
+                        del pending[name]
+                        changed = True
+
+            if not running:
+                for name in pending:
+                    records[name] = {"status": "skipped", "start": None, "end": None, "error": "存在循环依赖"}
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                record = records[name]
+                record["end"] = time.monotonic() - started
+                try:
+                    results[name] = future.result()
+                    record["status"] = "ok"
+                except Exception as e:
+                    record["status"] = "failed"
+                    record["error"] = str(e)
+                    print_warning(f"步骤 {name} 失败: {e}")
+
+    print_plan_report(steps, records, time.monotonic() - started)
+    return results, records
+
+
+def plan_critical_path(steps, records):
+    deps = {step["name"]: step.get("deps", []) for step in steps}
+    finished = [name for name, rec in records.items() if rec.get("end") is not None]
+    if not finished:
+        return []
+    node = max(finished, key=lambda name: records[name]["end"])
+    path = [node]
+    while True:
+        preds = [dep for dep in deps[node] if records.get(dep, {}).get("end") is not None]
+        if not preds:
+            break
+        node = max(preds, key=lambda name: records[name]["end"])
+        path.append(node)
+    return list(reversed(path))
+
+
+def print_plan_report(steps, records, total):
+    labels = {"ok": "成功", "failed": "失败", "skipped": "跳过", "running": "进行中"}
+    print("\n--- 执行计划耗时 ---")
+    print(f"{'步骤':<18} {'依赖':<24} {'开始':>8} {'耗时':>8}  结果")
+    serial = 0.0
+    for step in steps:
+        rec = records.get(step["name"], {})
+        deps = ",".join(step.get("deps", [])) or "-"
+        if rec.get("end") is not None:
+            duration = rec["end"] - rec["start"]
+            serial += duration
+            timing = f"{rec['start']:>7.1f}s {duration:>7.1f}s"
+        else:
+            timing = f"{'-':>8} {'-':>8}"
+        note = labels.get(rec.get("status"), "-")
+        if rec.get("error"):
+            note += f" ({rec['error']})"
+        print(f"{step['name']:<18} {deps:<24} {timing}  {note}")
+    path = plan_critical_path(steps, records)
+    if path:
+        chain = " -> ".join(f"{name}({records[name]['end'] - records[name]['start']:.1f}s)" for name in path)
+        print(f"关键路径: {chain}")
+    print(f"实际耗时 {total:.1f}s | 各步骤串行合计 {serial:.1f}s")
+
+
+def build_launch_plan(project_id, zone, os_config, instance_name, options, remote_config):
+    network = "global/networks/default"
+    provision = options.get("provision")
+    steps = [
+        {
+            "name": "create",
+            "deps": [],
+            "fn": lambda results: require_step(
+                create_instance(project_id, zone, os_config, instance_name), "实例创建失败"
+            ),
+        }
+    ]
+    last = "create"
+    if options.get("reroll"):
+        steps.append(
+            {
+                "name": "reroll",
+                "deps": ["create"],
+                "fn": lambda results: require_reroll(project_id, results["create"]),
+            }
+        )
+        last = "reroll"
+    if options.get("allow_ingress"):
+        steps.append(
+            {
+                "name": "firewall-ingress",
+                "deps": [],
+                "fn": lambda results: require_step(add_allow_all_ingress(project_id, network), "入站规则失败"),
+            }
+        )
+    if provision:
+        steps.append(
+            {
+                "name": "provision",
+                "deps": [last],
+                "fn": lambda results: require_step(
+                    wait_for_ssh_ready(project_id, results[last], remote_config)
+                    and run_provision_pipeline(project_id, results[last], remote_config, **provision),
+                    "远程部署失败",
+                ),
+            }
+        )
+    if options.get("deny_cdn"):
+        # 拒绝 CDN 出站会影响远程部署时的下载，放在部署之后。
+        steps.append(
+            {
+                "name": "firewall-cdn",
+                "deps": ["provision"] if provision else [],
+                "fn": lambda results: require_step(
+                    add_deny_cdn_egress(project_id, load_cdn_deny_ranges(), network), "出站规则失败"
+                ),
+            }
+        )
+    return steps
+
+
+def require_step(value, message):
+    if not value:
+        raise RuntimeError(message)
+    return value
+
+
+def require_reroll(project_id, instance_info):
+    result = reroll_until_amd(project_id, instance_info, log_prefix=f"[{instance_info['name']}] ", strategy="auto")
+    if not result["success"]:
+        raise RuntimeError(result["error"] or "未刷到 AMD CPU")
+    return result["instance_info"] or instance_info
+
+
+def launch_menu(project_id, remote_config):
+    print("\n--- 一键开通（自动规划并行步骤） ---")
+    zone = select_zone(project_id)
+    os_config = select_os_image()
+    instance_name = input("请输入实例名称 (默认 free-tier-vm): ").strip() or "free-tier-vm"
+
+    def ask(question):
+        return input(f"{question} (Y/n): ").strip().lower() in ("", "y", "yes")
+
+    options = {
+        "reroll": ask("创建后是否刷 AMD CPU?"),
+        "allow_ingress": ask("是否添加【允许所有入站连接】规则?"),
+        "deny_cdn": ask("是否添加【拒绝对 cdnip.txt 中 IP 的出站连接】规则?"),
+    }
+    if ask("是否执行远程完整部署 (换源 + dae + config.dae)?"):
+        if not remote_config:
+            remote_config = pick_remote_method()
+        if remote_config:
+            print("流量监控脚本: [1] net_iptables.sh  [2] net_shutdown.sh  [0] 不安装")
+            monitor_key = {"1": "net_iptables", "2": "net_shutdown"}.get(input("请输入数字选择: ").strip())
+            options["provision"] = {"with_apt": os_config["family"].startswith("debian"), "monitor_key": monitor_key}
+
+    steps = build_launch_plan(project_id, zone, os_config, instance_name, options, remote_config)
+    results, _ = run_plan(steps)
+    return results.get("reroll") or results.get("create"), remote_config
+
+
 def main():
     print("GCP 免费服务器多功能管理工具")
+    startup_report = os.environ.get("GCP_FREE_STARTUP_REPORT") == "1"
+    prefetch_google_modules([compute_v1])
+    menu_ready_at = time.perf_counter()
     project_id = select_gcp_project()
+    warm_inventory(project_id)
     current_instance = None
     remote_config = None
 
@@ -783,6 +3380,14 @@ def main():
         print("[7] 上传 config.dae 并启用 dae")
         print("[8] 安装流量监控脚本（仅适配 Debian）")
         print("[9] 删除当前免费资源")
+        print("[10] 并发刷 AMD CPU（多实例 / 多区域）")
+        print("[11] 扫描所有项目中的实例")
+        print("[12] 批量新建实例（多项目 / 多可用区）")
+        print("[13] 批量远程执行脚本 / 命令（多台服务器并发）")
+        print("[14] 一键完整部署（换源 + dae + config.dae + 流量监控）")
+        print("[15] 一键开通（创建 → 刷 CPU / 防火墙 → 部署，自动并行）")
+        print("[16] 批量删除免费资源（多台并发回收）")
+        print("[17] 查看各可用区刷 CPU 统计")
         print("[0] 退出")
         choice = input("请输入数字选择: ").strip()
 
@@ -796,7 +3401,8 @@ def main():
             if not current_instance:
                 current_instance = select_instance(project_id)
             if current_instance:
-                reroll_cpu_loop(project_id, current_instance)
+                result = reroll_cpu_loop(project_id, current_instance)
+                current_instance = result.get("instance_info") or current_instance
         elif choice == "4":
             if not current_instance:
                 current_instance = select_instance(project_id)
@@ -843,7 +3449,45 @@ def main():
             if current_instance:
                 if delete_free_resources(project_id, current_instance):
                     current_instance = None
+        elif choice == "10":
+            reroll_cpu_menu(project_id)
+        elif choice == "11":
+            selected = select_instance_across_projects()
+            if selected:
+                project_id = selected.pop("project")
+                current_instance = selected
+                print_info(f"已切换到项目 {project_id}，当前服务器: {current_instance['name']}")
+        elif choice == "12":
+            batch_create_menu(project_id)
+        elif choice == "13":
+            if not remote_config:
+                remote_config = pick_remote_method()
+            if remote_config:
+                remote_fanout_menu(project_id, remote_config)
+        elif choice == "14":
+            if not current_instance:
+                current_instance = select_instance(project_id)
+            if current_instance:
+                if not remote_config:
+                    remote_config = pick_remote_method()
+                if remote_config:
+                    provision_menu(project_id, current_instance, remote_config)
+        elif choice == "15":
+            instance_info, remote_config = launch_menu(project_id, remote_config)
+            if instance_info:
+                current_instance = instance_info
+        elif choice == "16":
+            deleted = delete_free_resources_menu(project_id)
+            if current_instance and instance_label(current_instance) in deleted:
+                current_instance = None
+        elif choice == "17":
+            print_zone_reroll_stats()
         elif choice == "0":
+            print_client_stats()
+            OPERATIONS.print_metrics()
+            print_remote_timings()
+            if startup_report:
+                print_startup_report(menu_ready_at)
             print("已退出。")
             break
         else:
@@ -858,3 +3502,6 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"\n[错误] 发生异常: {e}")
         traceback.print_exc()
+    finally:
+        close_ssh_sessions()
+        finish_tracing()
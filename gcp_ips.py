@@ -1,39 +1,177 @@
-import requests
+import argparse
+import codecs
 import ipaddress
+import json
+import os
+import re
+import time
+
+import requests
+
+DEFAULT_URL = "https://www.gstatic.com/ipranges/cloud.json"
+# 俄勒冈 (us-west1), 爱荷华 (us-central1), 南卡罗来纳 (us-east1)
+DEFAULT_REGIONS = ["us-west1", "us-central1", "us-east1"]
+CACHE_DIR = os.environ.get("GCP_FREE_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "gcp_free")
+RANGES_CACHE_FILE = "cloud_ranges.json"
+LAST_OUTPUT_FILE = "gcp_ips_last.json"
+# prefixes 里的每一项都是不含嵌套的扁平对象，可以边下载边匹配。
+PREFIX_OBJECT_RE = re.compile(r"\{[^{}]*\}")
+
+
+def cache_path(filename):
+    return os.path.join(CACHE_DIR, filename)
+
+
+def read_json_cache(filename):
+    try:
+        with open(cache_path(filename), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
 
-def get_gcp_ips_merged():
-    url = "https://www.gstatic.com/ipranges/cloud.json"
-    
-    # 俄勒冈 (us-west1), 爱荷华 (us-central1), 南卡罗来纳 (us-east1)
-    target_regions = {"us-west1", "us-central1", "us-east1"}
-    
-    print(f"正在获取并计算合并 IP 段...")
-    
+def write_json_cache(filename, data):
     try:
-        response = requests.get(url)
-        data = response.json()
-        
-        # 1. 收集所有目标区域的 IPv4 对象
-        networks = []
-        for prefix in data.get("prefixes", []):
-            if prefix.get("scope") in target_regions:
-                if "ipv4Prefix" in prefix:
-                    # 将字符串转换为 IPv4Network 对象
-                    net = ipaddress.IPv4Network(prefix["ipv4Prefix"])
-                    networks.append(net)
-        
-        # 2. 核心步骤：合并相邻网段 (collapse_addresses)
-        # 这个函数会自动去重，并将相邻/包含的网段合并为最大的 CIDR
-        merged_networks = list(ipaddress.collapse_addresses(networks))
-        
-        print(f"原始段数: {len(networks)} -> 合并后段数: {len(merged_networks)}\n")
-        
-        # 3. 输出结果
-        for net in merged_networks:
-            print(str(net))
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{cache_path(filename)}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path(filename))
+    except OSError as e:
+        print(f"[警告] 写入本地缓存失败: {e}")
+
+
+def iter_prefixes(chunks):
+    # 流式解析: 不把整个 cloud.json 读进内存，只保留未匹配完的尾部。
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        end = 0
+        for match in PREFIX_OBJECT_RE.finditer(buffer):
+            end = match.end()
+            item = json.loads(match.group(0))
+            if "ipv4Prefix" in item or "ipv6Prefix" in item:
+                yield {
+                    "scope": item.get("scope", ""),
+                    "prefix": item.get("ipv4Prefix") or item.get("ipv6Prefix"),
+                }
+        buffer = buffer[end:]
+
+
+def fetch_prefixes(url, force=False):
+    cached = read_json_cache(RANGES_CACHE_FILE)
+    if cached and cached.get("url") != url:
+        cached = None
+
+    headers = {}
+    if cached and not force:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    started = time.monotonic()
+    with requests.get(url, headers=headers, stream=True, timeout=30) as response:
+        if response.status_code == 304 and cached:
+            print(f"远端未变化 (304)，使用本地缓存 ({time.monotonic() - started:.2f}s)。")
+            return cached["prefixes"]
+        response.raise_for_status()
+        prefixes = list(iter_prefixes(response.iter_content(chunk_size=64 * 1024)))
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
 
+    write_json_cache(
+        RANGES_CACHE_FILE,
+        {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+            "prefixes": prefixes,
+        },
+    )
+    print(f"已下载 {len(prefixes)} 条前缀 ({time.monotonic() - started:.2f}s)。")
+    return prefixes
+
+
+def load_cached_prefixes():
+    cached = read_json_cache(RANGES_CACHE_FILE)
+    return cached["prefixes"] if cached else []
+
+
+def merge_region_networks(prefixes, regions, with_ipv6=False):
+    # 1. 收集目标区域的网段对象
+    networks = []
+    for item in prefixes:
+        if item["scope"] in regions:
+            net = ipaddress.ip_network(item["prefix"], strict=False)
+            if net.version == 4 or with_ipv6:
+                networks.append(net)
+
+    # 2. 合并相邻网段 (collapse_addresses 要求同一地址族)
+    merged = []
+    for version in (4, 6):
+        merged.extend(ipaddress.collapse_addresses(net for net in networks if net.version == version))
+    print(f"原始段数: {len(networks)} -> 合并后段数: {len(merged)}")
+    return [str(net) for net in merged]
+
+
+def diff_against_last_run(key, merged):
+    history = read_json_cache(LAST_OUTPUT_FILE) or {}
+    previous = history.get(key)
+    history[key] = merged
+    write_json_cache(LAST_OUTPUT_FILE, history)
+    if previous is None:
+        return None, None
+    previous_set, current_set = set(previous), set(merged)
+    added = [net for net in merged if net not in previous_set]
+    removed = [net for net in previous if net not in current_set]
+    return added, removed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="获取并合并指定区域的 GCP IP 段")
+    parser.add_argument("regions", nargs="*", default=DEFAULT_REGIONS, help="区域列表，默认: %(default)s")
+    parser.add_argument("--url", default=DEFAULT_URL, help="cloud.json 地址，可指向本地 HTTP 服务")
+    parser.add_argument("--ipv6", action="store_true", help="同时输出 IPv6 网段")
+    parser.add_argument("--refresh", action="store_true", help="忽略缓存强制重新下载")
+    parser.add_argument("--diff-only", action="store_true", help="只输出相对上次运行的增删")
+    return parser.parse_args(argv)
+
+
+def get_gcp_ips_merged(argv=None):
+    args = parse_args(argv)
+    regions = set(args.regions)
+    print("正在获取并计算合并 IP 段...")
+
+    try:
+        prefixes = fetch_prefixes(args.url, force=args.refresh)
     except Exception as e:
         print(f"发生错误: {e}")
+        prefixes = load_cached_prefixes()
+        if not prefixes:
+            return
+        print("改用本地缓存的数据。")
+
+    merged = merge_region_networks(prefixes, regions, with_ipv6=args.ipv6)
+    key = ",".join(sorted(regions)) + (";ipv6" if args.ipv6 else "")
+    added, removed = diff_against_last_run(key, merged)
+
+    # 3. 输出结果
+    if not args.diff_only:
+        print()
+        for net in merged:
+            print(net)
+    if added is None:
+        print("\n首次运行，已记录本次结果用于下次对比。")
+        return
+    print(f"\n相对上次: 新增 {len(added)} / 移除 {len(removed)}")
+    for net in added:
+        print(f"+ {net}")
+    for net in removed:
+        print(f"- {net}")
+
 
 if __name__ == "__main__":
-    get_gcp_ips_merged()
\ No newline at end of file
+    get_gcp_ips_merged()
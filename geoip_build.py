@@ -0,0 +1,167 @@
+import argparse
+import hashlib
+import ipaddress
+import json
+import os
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG = os.path.join(SCRIPT_DIR, "geoip_config.json")
+STAMP_FILE = os.path.join(SCRIPT_DIR, ".geoip_build.stamp")
+# 编码逻辑变化时递增，使旧的 stamp 失效。
+BUILDER_VERSION = "1"
+
+
+def encode_varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def encode_field(field_number, payload):
+    # 只用到 length-delimited (wire type 2) 和 varint (wire type 0) 两种字段。
+    if isinstance(payload, int):
+        return encode_varint(field_number << 3) + encode_varint(payload)
+    return encode_varint(field_number << 3 | 2) + encode_varint(len(payload)) + payload
+
+
+def read_text_cidrs(path):
+    networks = {4: set(), 6: set()}
+    invalid = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            clean_line = line.split("#", 1)[0].strip()
+            if not clean_line:
+                continue
+            entry = clean_line.split()[0]
+            try:
+                net = ipaddress.ip_network(entry, strict=False)
+            except ValueError:
+                invalid.append(entry)
+                continue
+            networks[net.version].add(net)
+    if invalid:
+        print(f"[警告] {path}: 忽略 {len(invalid)} 个无法解析的条目: {', '.join(invalid[:5])}")
+    # IPv4 在前、IPv6 在后，各自合并后按地址排序，保证输出稳定。
+    return [net for version in (4, 6) for net in ipaddress.collapse_addresses(networks[version])]
+
+
+def encode_geoip_list(entries):
+    # GeoIPList { repeated GeoIP entry = 1; }
+    # GeoIP { string country_code = 1; repeated CIDR cidr = 2; }
+    # CIDR { bytes ip = 1; uint32 prefix = 2; }
+    out = bytearray()
+    for name in sorted(entries):
+        geoip = bytearray(encode_field(1, name.upper().encode("utf-8")))
+        for net in entries[name]:
+            cidr = encode_field(1, net.network_address.packed) + encode_field(2, net.prefixlen)
+            geoip += encode_field(2, cidr)
+        out += encode_field(1, bytes(geoip))
+    return bytes(out)
+
+
+def load_config(config_path):
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(config_path))
+
+    inputs = []
+    for item in config.get("input", []):
+        if item.get("type") != "text" or item.get("action", "add") != "add":
+            raise ValueError(f"不支持的输入类型: {item.get('type')}/{item.get('action')}")
+        inputs.append((item["args"]["name"], os.path.join(base_dir, item["args"]["uri"])))
+
+    outputs = []
+    for item in config.get("output", []):
+        if item.get("type") != "v2rayGeoIPDat":
+            raise ValueError(f"不支持的输出类型: {item.get('type')}")
+        args = item.get("args", {})
+        output_path = os.path.join(base_dir, args.get("outputDir", "."), args.get("outputName", "geoip.dat"))
+        outputs.append(os.path.normpath(output_path))
+    return inputs, outputs
+
+
+def input_digest(config_path, inputs):
+    digest = hashlib.sha256(BUILDER_VERSION.encode())
+    for path in [config_path] + [path for _, path in inputs]:
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def read_stamp():
+    try:
+        with open(STAMP_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def output_matches(path, sha256):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest() == sha256
+    except OSError:
+        return False
+
+
+def write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build(config_path=DEFAULT_CONFIG, force=False):
+    started = time.monotonic()
+    inputs, outputs = load_config(config_path)
+    digest = input_digest(config_path, inputs)
+
+    stamp = read_stamp()
+    if not force and stamp.get("input") == digest and all(
+        output_matches(path, stamp.get("outputs", {}).get(path)) for path in outputs
+    ):
+        print(f"输入未变化，跳过生成 ({(time.monotonic() - started) * 1000:.1f}ms)。")
+        return False
+
+    entries = {}
+    for name, path in inputs:
+        entries.setdefault(name, []).extend(read_text_cidrs(path))
+        print(f"{name}: {path} -> {len(entries[name])} 个网段")
+    data = encode_geoip_list(entries)
+    sha256 = hashlib.sha256(data).hexdigest()
+
+    for path in outputs:
+        write_atomic(path, data)
+        write_atomic(f"{path}.sha256sum", f"{sha256}  {os.path.basename(path)}\n".encode())
+        print(f"已生成 {path} ({len(data)} 字节, sha256 {sha256[:16]}...)")
+
+    write_atomic(
+        STAMP_FILE,
+        json.dumps({"input": digest, "outputs": {path: sha256 for path in outputs}}, indent=2).encode(),
+    )
+    print(f"完成，耗时 {(time.monotonic() - started) * 1000:.1f}ms。")
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="根据 geoip_config.json 生成 v2ray geoip.dat")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="配置文件，默认: %(default)s")
+    parser.add_argument("--force", action="store_true", help="忽略输入哈希强制重新生成")
+    args = parser.parse_args(argv)
+    try:
+        build(args.config, force=args.force)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"【错误】生成 geoip.dat 失败: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
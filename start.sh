@@ -5,7 +5,34 @@ SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 cd "$SCRIPT_DIR"
 
 VENV_DIR="${SCRIPT_DIR}/.venv"
+WHEEL_DIR="${SCRIPT_DIR}/.wheels"
 INIT_MARKER="${SCRIPT_DIR}/.gcp_free_initialized"
+PY_PACKAGES=(google-cloud-compute google-cloud-resource-manager)
+
+install_packages() {
+  # 优先使用本地 wheel 缓存离线安装；缓存缺失或失效时联网下载并刷新缓存。
+  # 传入 refresh (--warm) 时先联网重新生成 wheel 缓存，再从缓存安装。
+  local upgrade=()
+  if [[ "${1:-}" == "refresh" ]]; then
+    echo "[初始化] 正在刷新 wheel 缓存..."
+    python -m pip wheel --disable-pip-version-check -q -w "$WHEEL_DIR" "${PY_PACKAGES[@]}" || \
+      echo "[初始化] wheel 缓存刷新失败，继续使用现有缓存。"
+    upgrade=(--upgrade)
+  fi
+  if [[ -d "$WHEEL_DIR" ]] && python -m pip install --disable-pip-version-check -q ${upgrade[@]+"${upgrade[@]}"} \
+      --no-index --find-links "$WHEEL_DIR" "${PY_PACKAGES[@]}"; then
+    echo "[初始化] 已从本地 wheel 缓存安装依赖。"
+  else
+    python -m pip install --disable-pip-version-check "${PY_PACKAGES[@]}"
+    python -m pip wheel --disable-pip-version-check -q -w "$WHEEL_DIR" "${PY_PACKAGES[@]}" || \
+      echo "[初始化] wheel 缓存生成失败，已跳过（不影响运行）。"
+  fi
+}
+
+warm_venv() {
+  # 预编译字节码，避免首次运行时再编译。
+  python -m compileall -q -j 0 "$VENV_DIR/lib" "$SCRIPT_DIR/gcp.py" >/dev/null 2>&1 || true
+}
 
 if [[ ! -f "$INIT_MARKER" ]]; then
   if ! command -v gcloud >/dev/null 2>&1; then
@@ -37,7 +64,8 @@ if [[ ! -f "$INIT_MARKER" ]]; then
 
   # shellcheck disable=SC1091
   source "$VENV_DIR/bin/activate"
-  python -m pip install google-cloud-compute google-cloud-resource-manager
+  install_packages
+  warm_venv
 
   touch "$INIT_MARKER"
 else
@@ -48,6 +76,11 @@ else
   fi
   # shellcheck disable=SC1091
   source "$VENV_DIR/bin/activate"
+  if [[ "${1:-}" == "--warm" ]]; then
+    echo "[初始化] 正在预热 venv..."
+    install_packages refresh
+    warm_venv
+  fi
 fi
 
 exec python gcp.py